@@ -1,21 +1,41 @@
-from flask import Flask, request, jsonify, redirect, url_for
+from flask import Flask, request, jsonify, redirect, url_for, Response, stream_with_context
 from flask_cors import CORS
 from flask_migrate import Migrate
-from models import db, User, Translation
+from flask_sock import Sock
+from models import db, User, Translation, Job
 import speech_recognition as sr
 from deep_translator import GoogleTranslator
 from gtts import gTTS
 import os
 import tempfile
 import base64
+import io
 import requests
-from datetime import datetime
+from datetime import datetime, time as day_time
 import urllib3
 import time
 import json
+import threading
 from googletrans import Translator
 from dotenv import load_dotenv
 from chatbot import chatbot_bp
+from translation_memory import TM_SYNC_INTERVAL, translation_memory
+from shared_cache import shared_cache
+from document_translation import translate_document
+from speech_pipeline import run_pipeline
+from jobs import PRIORITIES, dedupe_key, job_queue, job_to_dict
+from history_io import export_ndjson, export_csv, import_translations
+from retention import (
+    RETENTION_DAYS, RETENTION_INTERVAL_SECONDS, archived_languages_query, compact_history,
+    iter_archived, newest_archived_at
+)
+from languages import (
+    AUTO, LANGUAGES, TRANSLATION, TTS, UnsupportedLanguage, capabilities, recognition_locale,
+    require, require_translation_pair
+)
+from live_session import (
+    BACKPRESSURE_TIMEOUT, LiveSession, Outbox, SessionOverloaded, audio_format, local_recognizer
+)
 import jwt
 from functools import wraps
 
@@ -23,11 +43,40 @@ load_dotenv()
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+sock = Sock(app)
 
 # Clerk configuration
 CLERK_SECRET_KEY = os.getenv('CLERK_SECRET_KEY')
 CLERK_JWT_ISSUER = os.getenv('CLERK_JWT_ISSUER', 'https://clerk.your-domain.com')
 
+def get_user_from_token(token):
+    # Decode the JWT token without verification for now
+    # In production, you should verify the token with Clerk's public key
+    decoded = jwt.decode(token, options={"verify_signature": False})
+    print(f"Decoded token: {decoded}")  # Debug log
+    
+    # Get the user ID from the sub claim
+    user_id = decoded.get('sub')
+    if not user_id:
+        print("No user ID in token")  # Debug log
+        return None
+    
+    # Get or create user
+    user = User.query.filter_by(google_id=user_id).first()
+    if not user:
+        print(f"Creating new user with ID: {user_id}")  # Debug log
+        user = User(
+            email=None,  # Set to None instead of empty string
+            name=None,   # Set to None instead of empty string
+            picture=None, # Set to None instead of empty string
+            google_id=user_id
+        )
+        db.session.add(user)
+        db.session.commit()
+    else:
+        print(f"Found existing user: {user.id}")  # Debug log
+    return user
+
 def verify_clerk_token(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -42,31 +91,9 @@ def verify_clerk_token(f):
         print(f"Token received: {token[:20]}...")  # Debug log (only print first 20 chars)
         
         try:
-            # Decode the JWT token without verification for now
-            # In production, you should verify the token with Clerk's public key
-            decoded = jwt.decode(token, options={"verify_signature": False})
-            print(f"Decoded token: {decoded}")  # Debug log
-            
-            # Get the user ID from the sub claim
-            user_id = decoded.get('sub')
-            if not user_id:
-                print("No user ID in token")  # Debug log
-                return jsonify({"error": "Invalid token format"}), 401
-            
-            # Get or create user
-            user = User.query.filter_by(google_id=user_id).first()
+            user = get_user_from_token(token)
             if not user:
-                print(f"Creating new user with ID: {user_id}")  # Debug log
-                user = User(
-                    email=None,  # Set to None instead of empty string
-                    name=None,   # Set to None instead of empty string
-                    picture=None, # Set to None instead of empty string
-                    google_id=user_id
-                )
-                db.session.add(user)
-                db.session.commit()
-            else:
-                print(f"Found existing user: {user.id}")  # Debug log
+                return jsonify({"error": "Invalid token format"}), 401
             
             # Add user to request context
             request.user = user
@@ -90,10 +117,13 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 migrate = Migrate(app, db)
 
-# Create tables with the correct schema
-with app.app_context():
-    db.drop_all()  # Drop all tables
-    db.create_all()  # Create tables with the correct schema
+# Local development only: start from empty tables with the current schema.
+# Everywhere else the schema comes from the migrations (`flask --app wsgi db
+# upgrade`, run before gunicorn starts), and data survives restarts.
+if os.getenv('DEV_RESET_DB') == '1':
+    with app.app_context():
+        db.drop_all()  # Drop all tables
+        db.create_all()  # Create tables with the correct schema
 
 # Disable SSL verification warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -103,22 +133,6 @@ recognizer = sr.Recognizer()
 # Set shorter timeout for speech recognition
 recognizer.operation_timeout = 5  # 5 seconds timeout
 
-# Language code mapping for special cases
-LANGUAGE_CODE_MAP = {
-    'zh': 'chinese',    # Updated language codes
-    'ja': 'japanese',
-    'ko': 'korean',
-    'ar': 'arabic',
-    'hi': 'hindi',
-    'en': 'english',
-    'es': 'spanish',
-    'fr': 'french',
-    'de': 'german',
-    'it': 'italian',
-    'pt': 'portuguese',
-    'ru': 'russian'
-}
-
 # Initialize translator with service URLs
 translator = Translator(service_urls=['translate.google.com'])
 
@@ -130,17 +144,20 @@ def get_dashboard_stats():
     try:
         user = request.user  # Get user from request context
         # Get today's translations count
-        today = datetime.utcnow().date()
+        # A range on created_at (not date(created_at)) can use the
+        # (user_id, created_at) index; today's rows are always hot
+        today_start = datetime.combine(datetime.utcnow().date(), day_time.min)
         translations_today = Translation.query.filter(
-            db.func.date(Translation.created_at) == today,
-            Translation.user_id == user.id
+            Translation.user_id == user.id,
+            Translation.created_at >= today_start
         ).count()
 
-        # Get unique languages used
-        languages_used = db.session.query(
-            db.func.count(db.func.distinct(Translation.target_lang))
-        ).filter(
+        # Get unique languages used, hot rows plus archived aggregates
+        hot_languages = db.session.query(Translation.target_lang).filter(
             Translation.user_id == user.id
+        )
+        languages_used = db.session.query(db.func.count()).select_from(
+            hot_languages.union(archived_languages_query(user.id)).subquery()
         ).scalar()
 
         # Get favorite translations count
@@ -174,6 +191,19 @@ def get_recent_translations():
         ).order_by(
             Translation.created_at.desc()
         ).limit(5).all()
+        # Old favorites stay hot, so archived rows can still be newer than
+        # some of these; only then is the newest archive segment read
+        newest_archived = newest_archived_at(user.id)
+        if newest_archived and (len(translations) < 5 or
+                                newest_archived > translations[-1].created_at):
+            archived = []
+            for row in iter_archived(user.id, newest_first=True):
+                archived.append(row)
+                if len(archived) == 5:
+                    break
+            translations = sorted(
+                translations + archived, key=lambda t: t.created_at, reverse=True
+            )[:5]
 
         return jsonify({
             'translations': [{
@@ -187,6 +217,86 @@ def get_recent_translations():
         print(f"Error getting recent translations: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/translations/export', methods=['GET'])
+@verify_clerk_token
+def export_translations():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': f'Unsupported export format: {fmt}'}), 400
+    
+    # Rows are generated batch by batch while the response is being sent
+    user_id = request.user.id
+    if fmt == 'csv':
+        body, mimetype = export_csv(user_id), 'text/csv'
+    else:
+        body, mimetype = export_ndjson(user_id), 'application/x-ndjson'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=translations.{fmt}'}
+    )
+
+@app.route('/api/translations/import', methods=['POST', 'OPTIONS'])
+def import_translation_history():
+    if request.method == 'OPTIONS':
+        return '', 204
+        
+    # Only verify token for POST requests
+    @verify_clerk_token
+    def handle_import():
+        fmt = request.args.get('format')
+        if fmt is None:
+            fmt = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+        if fmt not in ('ndjson', 'csv'):
+            return jsonify({'error': f'Unsupported import format: {fmt}'}), 400
+        
+        try:
+            # The body is read as a stream, never buffered whole
+            summary = import_translations(request.user.id, request.stream, fmt)
+            print(f"Imported translations: {summary['imported']} ok, {summary['rejected']} rejected")  # Debug log
+            return jsonify(summary)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Import error: {str(e)}")  # Debug log
+            return jsonify({'error': str(e)}), 500
+            
+    return handle_import()
+
+@app.route('/api/dashboard/archived-translations', methods=['GET'])
+@verify_clerk_token
+def get_archived_translations():
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+        before = request.args.get('before')
+        before = datetime.fromisoformat(before) if before else None
+        # Pages continue from next_before/next_before_id of the previous one
+        before_id = request.args.get('before_id', type=int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        translations = []
+        last = None
+        for t in iter_archived(request.user.id, newest_first=True, before=before, before_id=before_id):
+            last = t
+            translations.append({
+                'id': t.id,
+                'from': t.source_text,
+                'to': t.translated_text,
+                'source_lang': t.source_lang,
+                'target_lang': t.target_lang,
+                'date': t.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            })
+            if len(translations) == limit:
+                break
+        return jsonify({
+            'translations': translations,
+            'next_before': last.created_at.isoformat() if len(translations) == limit else None,
+            'next_before_id': last.id if len(translations) == limit else None
+        })
+    except Exception as e:
+        print(f"Error getting archived translations: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/dashboard/update-preferences', methods=['POST', 'OPTIONS'])
 @verify_clerk_token
 def update_dashboard_preferences():
@@ -196,10 +306,12 @@ def update_dashboard_preferences():
         user = request.user  # Get user from request context
         data = request.get_json()
         if 'primary_language' in data:
-            user.preferred_language = data['primary_language']
+            user.preferred_language = require(data['primary_language'], TRANSLATION).code
             db.session.commit()
             return jsonify({'message': 'Preferences updated successfully'})
         return jsonify({'error': 'Invalid data'}), 400
+    except UnsupportedLanguage as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error updating preferences: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -211,7 +323,10 @@ def recognize_speech():
         return jsonify({'error': 'No audio file provided'}), 400
     
     audio_file = request.files['audio']
-    language = request.form.get('language', 'en-US')
+    try:
+        language = recognition_locale(request.form.get('language', 'en-US'))
+    except UnsupportedLanguage as e:
+        return jsonify({'error': str(e)}), 400
     
     try:
         # Save the uploaded audio file temporarily
@@ -232,6 +347,13 @@ def recognize_speech():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def translate_segment(segment, source_lang, target_lang):
+    # Takes canonical registry codes (source may be 'auto')
+    source = source_lang if source_lang == AUTO else LANGUAGES[source_lang].translation_code
+    target = LANGUAGES[target_lang].translation_code
+    # A translator per call: segments are translated from worker threads
+    return GoogleTranslator(source=source, target=target).translate(segment)
+
 @app.route('/api/translate', methods=['POST', 'OPTIONS'])
 def translate():
     if request.method == 'OPTIONS':
@@ -245,17 +367,44 @@ def translate():
             text = data.get('text')
             source_lang = data.get('source_lang', 'auto')
             target_lang = data.get('target_lang', 'en')
+            mode = data.get('mode', 'text')
             
             if not text:
                 return jsonify({'error': 'No text provided'}), 400
+            if mode not in ('text', 'document'):
+                return jsonify({'error': f'Unknown translation mode: {mode}'}), 400
+            try:
+                source, target = require_translation_pair(source_lang, target_lang)
+            except UnsupportedLanguage as e:
+                return jsonify({'error': str(e)}), 400
+            # Canonical codes from here on: caches and history rows use them
+            source_lang = source if source == AUTO else source.code
+            target_lang = target.code
                 
             print(f"Received translation request: {text[:50]}...")  # Debug log
             print(f"Source language: {source_lang}, Target language: {target_lang}")  # Debug log
             
+            # A source translated upstream before is served from translation memory
+            memory_match = None
+            if mode == 'text':
+                memory_match = translation_memory.best_match(text, source_lang, target_lang)
+            segment_stats = None
+            
             # Use deep_translator for translation
             try:
-                translated = GoogleTranslator(source=source_lang, target=target_lang).translate(text)
-                print(f"Translation successful: {translated[:50]}...")  # Debug log
+                if mode == 'document':
+                    # Only segments not translated before go upstream
+                    translated, segment_stats = translate_document(
+                        text, source_lang, target_lang, translate_segment
+                    )
+                    print(f"Document translation: {segment_stats}")  # Debug log
+                elif memory_match is not None:
+                    translated = memory_match
+                    print("Translation memory hit")  # Debug log
+                else:
+                    translated = translate_segment(text, source_lang, target_lang)
+                    translation_memory.remember(text, translated, source_lang, target_lang)
+                    print(f"Translation successful: {translated[:50]}...")  # Debug log
                 
                 # Save translation to database
                 translation = Translation(
@@ -271,7 +420,9 @@ def translate():
                 return jsonify({
                     'translated_text': translated,
                     'source_lang': source_lang,
-                    'target_lang': target_lang
+                    'target_lang': target_lang,
+                    'from_memory': memory_match is not None,
+                    'segments': segment_stats
                 })
             except Exception as e:
                 print(f"Translation error: {str(e)}")  # Debug log
@@ -283,6 +434,292 @@ def translate():
             
     return handle_translate()
 
+def synthesize_speech(text, tts_lang):
+    # In-memory gTTS synthesis, no temporary files
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=tts_lang).write_to_fp(buffer)
+    return buffer.getvalue()
+
+def recognize_pcm(segment, sample_rate, sample_width, language='en-US'):
+    try:
+        segment_audio = sr.AudioData(segment, sample_rate, sample_width)
+        return recognizer.recognize_google(segment_audio, language=language)
+    except sr.UnknownValueError:
+        return None  # Nothing intelligible in this segment
+
+def generate_speech(text, tts_lang):
+    # Create a temporary file to store the audio
+    temp_file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
+    temp_file_path = temp_file.name
+    temp_file.close()
+    
+    print(f"Created temporary file: {temp_file_path}")  # Debug log
+    
+    try:
+        # Generate speech using gTTS with retries
+        max_retries = 3
+        retry_delay = 2  # seconds
+        last_error = None
+        
+        for attempt in range(max_retries):
+            try:
+                print(f"Attempt {attempt + 1} of {max_retries}")  # Debug log
+                
+                # Split text into chunks if it's too long (gTTS has a limit)
+                max_chars = 5000
+                if len(text) > max_chars:
+                    print(f"Text too long ({len(text)} chars), splitting into chunks")  # Debug log
+                    chunks = [text[i:i+max_chars] for i in range(0, len(text), max_chars)]
+                    print(f"Split into {len(chunks)} chunks")  # Debug log
+                    
+                    # Generate audio for each chunk and combine
+                    with open(temp_file_path, 'wb') as f:
+                        for i, chunk in enumerate(chunks):
+                            print(f"Processing chunk {i+1}/{len(chunks)}")  # Debug log
+                            f.write(synthesize_speech(chunk, tts_lang))
+                else:
+                    tts = gTTS(text=text, lang=tts_lang)
+                    tts.save(temp_file_path)
+                
+                print("Successfully generated audio file")  # Debug log
+                print(f"File size: {os.path.getsize(temp_file_path)} bytes")  # Debug log
+                break
+            except Exception as e:
+                last_error = str(e)
+                print(f"Attempt {attempt + 1} failed: {last_error}")  # Debug log
+                if attempt < max_retries - 1:  # Don't sleep on last attempt
+                    print(f"Waiting {retry_delay} seconds before retry...")  # Debug log
+                    time.sleep(retry_delay)
+        
+        if not os.path.exists(temp_file_path) or os.path.getsize(temp_file_path) == 0:
+            raise Exception(f"Failed to generate audio file after all retries. Last error: {last_error}")
+        
+        with open(temp_file_path, 'rb') as audio_file:
+            return audio_file.read()
+    
+    finally:
+        # Clean up the temporary file
+        if os.path.exists(temp_file_path):
+            try:
+                os.unlink(temp_file_path)
+                print("Cleaned up temporary file")  # Debug log
+            except Exception as e:
+                print(f"Error cleaning up temporary file: {str(e)}")  # Debug log
+
+@app.route('/api/speech-to-speech', methods=['POST', 'OPTIONS'])
+def speech_to_speech():
+    if request.method == 'OPTIONS':
+        return '', 204
+        
+    # Only verify token for POST requests
+    @verify_clerk_token
+    def handle_speech_to_speech():
+        if 'audio' not in request.files:
+            return jsonify({'error': 'No audio file provided'}), 400
+        
+        audio_file = request.files['audio']
+        with_audio = request.form.get('synthesize', 'true').lower() != 'false'
+        try:
+            language = recognition_locale(request.form.get('language', 'en-US'))
+            source, target = require_translation_pair(
+                request.form.get('source_lang', AUTO), request.form.get('target_lang', 'en')
+            )
+            tts_lang = require(target.code, TTS).tts_code if with_audio else None
+        except UnsupportedLanguage as e:
+            return jsonify({'error': str(e)}), 400
+        source_lang = source if source == AUTO else source.code
+        target_lang = target.code
+        
+        try:
+            started = time.perf_counter()
+            with sr.AudioFile(io.BytesIO(audio_file.read())) as audio_source:
+                audio_data = recognizer.record(audio_source)
+            decode_ms = (time.perf_counter() - started) * 1000
+            
+            def recognize(segment):
+                return recognize_pcm(segment, audio_data.sample_rate, audio_data.sample_width, language)
+            
+            def translate_text(text):
+                return translate_segment(text, source_lang, target_lang)
+            
+            def synthesize(text):
+                return synthesize_speech(text, tts_lang)
+            
+            segments, timings = run_pipeline(
+                audio_data.get_raw_data(),
+                audio_data.sample_rate,
+                audio_data.sample_width,
+                recognize,
+                translate_text,
+                synthesize if with_audio else None
+            )
+            timings['decode_ms'] = round(decode_ms, 1)
+            print(f"Speech-to-speech timings: {timings}")  # Debug log
+            
+            recognized = [s for s in segments if s['text']]
+            text = ' '.join(s['text'] for s in recognized)
+            translated = ' '.join(s['translated_text'] for s in recognized if s['translated_text'])
+            if not text:
+                return jsonify({'error': 'No speech recognized', 'timings': timings}), 422
+            
+            if translated:
+                db.session.add(Translation(
+                    user_id=request.user.id,
+                    source_text=text,
+                    translated_text=translated,
+                    source_lang=source_lang,
+                    target_lang=target_lang
+                ))
+                db.session.commit()
+            
+            response = {
+                'text': text,
+                'translated_text': translated,
+                'segments': [{
+                    'text': s['text'],
+                    'translated_text': s['translated_text']
+                } for s in recognized],
+                'timings': timings
+            }
+            if with_audio:
+                # MP3 frames concatenate into one playable stream
+                audio = b''.join(s['audio'] for s in recognized if s['audio'])
+                response['audio_data'] = base64.b64encode(audio).decode('utf-8')
+            return jsonify(response)
+        
+        except Exception as e:
+            print(f"Speech-to-speech error: {str(e)}")  # Debug log
+            return jsonify({'error': str(e)}), 500
+            
+    return handle_speech_to_speech()
+
+# Live sessions can run against a local recognizer for offline testing
+LIVE_RECOGNIZER = os.getenv('LIVE_RECOGNIZER', 'google')
+
+@sock.route('/ws/interpret')
+def live_interpret(ws):
+    """Live interpretation over a WebSocket.
+
+    The first message is JSON: {"type": "start", "token", "sample_rate",
+    "sample_width", "language", "source_lang", "target_lang", "synthesize",
+    "partials"}. Binary messages after it are raw mono PCM frames, and
+    {"type": "stop"} flushes the last utterance and ends the session.
+    Partial transcripts cost extra upstream calls and are off unless the
+    start message asks for them.
+    """
+    try:
+        config = json.loads(ws.receive(timeout=10) or '{}')
+    except Exception as e:
+        ws.send(json.dumps({'type': 'error', 'error': f'Invalid start message: {str(e)}'}))
+        return
+    if config.get('type') != 'start':
+        ws.send(json.dumps({'type': 'error', 'error': 'Expected a start message'}))
+        return
+    try:
+        user = get_user_from_token(config.get('token', ''))
+    except Exception as e:
+        print(f"Token verification error: {str(e)}")  # Debug log
+        user = None
+    if not user:
+        ws.send(json.dumps({'type': 'error', 'error': 'Token verification failed'}))
+        return
+
+    try:
+        language = recognition_locale(config.get('language', 'en-US'))
+        source, target = require_translation_pair(
+            config.get('source_lang', AUTO), config.get('target_lang', 'en')
+        )
+        tts_lang = require(target.code, TTS).tts_code if config.get('synthesize') else None
+    except UnsupportedLanguage as e:
+        ws.send(json.dumps({'type': 'error', 'error': str(e)}))
+        return
+    try:
+        sample_rate, sample_width = audio_format(
+            config.get('sample_rate', 16000), config.get('sample_width', 2)
+        )
+    except ValueError as e:
+        ws.send(json.dumps({'type': 'error', 'error': str(e)}))
+        return
+    source_lang = source if source == AUTO else source.code
+    target_lang = target.code
+
+    def recognize(segment, sample_rate, sample_width):
+        if LIVE_RECOGNIZER == 'local':
+            return local_recognizer(segment, sample_rate, sample_width)
+        return recognize_pcm(segment, sample_rate, sample_width, language)
+
+    outbox = Outbox()
+    session = LiveSession(
+        outbox,
+        recognize,
+        lambda text: translate_segment(text, source_lang, target_lang),
+        (lambda text: synthesize_speech(text, tts_lang)) if config.get('synthesize') else None,
+        sample_rate=sample_rate,
+        sample_width=sample_width,
+        partials=bool(config.get('partials', False))
+    )
+    sender = threading.Thread(
+        target=outbox.drain,
+        args=(lambda message: ws.send(json.dumps(message)),),
+        daemon=True
+    )
+    sender.start()
+    session.start()
+
+    try:
+        while not outbox.closed:
+            # Wakes up now and then to notice a client that stopped reading
+            message = ws.receive(timeout=BACKPRESSURE_TIMEOUT)
+            if message is None:
+                continue
+            if isinstance(message, (bytes, bytearray)):
+                session.feed_audio(message)
+            elif json.loads(message).get('type') == 'stop':
+                break
+    except (SessionOverloaded, ValueError) as e:
+        outbox.put({'type': 'error', 'error': str(e)})
+    except Exception as e:
+        print(f"Live session error: {str(e)}")  # Debug log
+    finally:
+        session.finish()
+        sender.join(timeout=BACKPRESSURE_TIMEOUT)
+
+@app.route('/api/translation-memory/suggest', methods=['POST', 'OPTIONS'])
+def translation_memory_suggest():
+    if request.method == 'OPTIONS':
+        return '', 204
+        
+    # Only verify token for POST requests
+    @verify_clerk_token
+    def handle_suggest():
+        try:
+            data = request.get_json()
+            text = data.get('text')
+            source_lang = data.get('source_lang', 'auto')
+            target_lang = data.get('target_lang', 'en')
+            
+            if not text:
+                return jsonify({'error': 'No text provided'}), 400
+            try:
+                source, target = require_translation_pair(source_lang, target_lang)
+            except UnsupportedLanguage as e:
+                return jsonify({'error': str(e)}), 400
+            source_lang = source if source == AUTO else source.code
+            target_lang = target.code
+            
+            # Purely local lookup over the caller's own history, never calls
+            # the upstream translator
+            limit = min(max(int(data.get('limit', 3)), 1), 20)
+            matches = translation_memory.lookup(
+                request.user.id, text, source_lang, target_lang, limit=limit
+            )
+            return jsonify({'suggestions': matches})
+        except Exception as e:
+            print(f"Translation memory error: {str(e)}")  # Debug log
+            return jsonify({'error': str(e)}), 500
+            
+    return handle_suggest()
+
 @app.route('/api/text-to-speech', methods=['POST', 'OPTIONS'])
 def text_to_speech():
     if request.method == 'OPTIONS':
@@ -303,89 +740,22 @@ def text_to_speech():
             print(f"Text length: {len(text)} characters")  # Debug log
             print(f"Text content: {text[:100]}...")  # Debug log (first 100 chars)
                 
-            # Map language codes for gTTS
-            language_map = {
-                'zh-CN': 'zh-cn',
-                'zh-TW': 'zh-tw',
-                'en': 'en',
-                'es': 'es',
-                'fr': 'fr',
-                'de': 'de',
-                'it': 'it',
-                'pt': 'pt',
-                'ru': 'ru',
-                'ja': 'ja',
-                'ko': 'ko'
-            }
-            
-            # Get the correct language code for gTTS
-            tts_lang = language_map.get(language, 'en')
+            # Get the correct language code for gTTS; unsupported languages
+            # are rejected here rather than read out with the wrong voice
+            try:
+                tts_language = require(language, TTS)
+            except UnsupportedLanguage as e:
+                return jsonify({'error': 'Unsupported language for text-to-speech.', 'details': str(e)}), 400
+            language = tts_language.code
+            tts_lang = tts_language.tts_code
             print(f"Using gTTS language code: {tts_lang}")  # Debug log
                 
-            # Create a temporary file to store the audio
-            temp_file = None
-            temp_file_path = None
             try:
-                temp_file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-                temp_file_path = temp_file.name
-                temp_file.close()
-                
-                print(f"Created temporary file: {temp_file_path}")  # Debug log
-                
-                # Generate speech using gTTS with retries
-                max_retries = 3
-                retry_delay = 2  # seconds
-                last_error = None
-                
-                for attempt in range(max_retries):
-                    try:
-                        print(f"Attempt {attempt + 1} of {max_retries}")  # Debug log
-                        
-                        # Split text into chunks if it's too long (gTTS has a limit)
-                        max_chars = 5000
-                        if len(text) > max_chars:
-                            print(f"Text too long ({len(text)} chars), splitting into chunks")  # Debug log
-                            chunks = [text[i:i+max_chars] for i in range(0, len(text), max_chars)]
-                            print(f"Split into {len(chunks)} chunks")  # Debug log
-                            
-                            # Generate audio for each chunk and combine
-                            combined_audio = []
-                            for i, chunk in enumerate(chunks):
-                                print(f"Processing chunk {i+1}/{len(chunks)}")  # Debug log
-                                chunk_tts = gTTS(text=chunk, lang=tts_lang)
-                                chunk_file = f"{temp_file_path}.chunk{i}"
-                                chunk_tts.save(chunk_file)
-                                
-                                with open(chunk_file, 'rb') as f:
-                                    combined_audio.append(f.read())
-                                
-                                # Clean up chunk file
-                                os.unlink(chunk_file)
-                            
-                            # Combine all chunks and save to final file
-                            with open(temp_file_path, 'wb') as f:
-                                for audio_chunk in combined_audio:
-                                    f.write(audio_chunk)
-                        else:
-                            tts = gTTS(text=text, lang=tts_lang)
-                            tts.save(temp_file_path)
-                        
-                        print("Successfully generated audio file")  # Debug log
-                        print(f"File size: {os.path.getsize(temp_file_path)} bytes")  # Debug log
-                        break
-                    except Exception as e:
-                        last_error = str(e)
-                        print(f"Attempt {attempt + 1} failed: {last_error}")  # Debug log
-                        if attempt < max_retries - 1:  # Don't sleep on last attempt
-                            print(f"Waiting {retry_delay} seconds before retry...")  # Debug log
-                            time.sleep(retry_delay)
-                
-                if not os.path.exists(temp_file_path) or os.path.getsize(temp_file_path) == 0:
-                    raise Exception(f"Failed to generate audio file after all retries. Last error: {last_error}")
-                
-                # Read the audio file and convert to base64
-                with open(temp_file_path, 'rb') as audio_file:
-                    audio_data = base64.b64encode(audio_file.read()).decode('utf-8')
+                # Audio generated before, e.g. warmed by a background job, is served as is
+                audio_data = shared_cache.get(tts_audio_key(text, language))
+                if audio_data is None:
+                    audio_data = base64.b64encode(generate_speech(text, tts_lang)).decode('utf-8')
+                    shared_cache.set(tts_audio_key(text, language), audio_data)
                     print("Successfully encoded audio data")  # Debug log
                 
                 return jsonify({
@@ -415,15 +785,6 @@ def text_to_speech():
                         'details': str(e)
                     }), 500
                 
-            finally:
-                # Clean up the temporary file
-                if temp_file_path and os.path.exists(temp_file_path):
-                    try:
-                        os.unlink(temp_file_path)
-                        print("Cleaned up temporary file")  # Debug log
-                    except Exception as e:
-                        print(f"Error cleaning up temporary file: {str(e)}")  # Debug log
-                
         except Exception as e:
             print(f"Text-to-speech error: {str(e)}")  # Debug log
             return jsonify({
@@ -433,6 +794,173 @@ def text_to_speech():
             
     return handle_text_to_speech()
 
+def tts_audio_key(text, language):
+    return f"tts:{dedupe_key('tts', {'text': text, 'language': language})}"
+
+def run_tts_job(payload):
+    # The audio goes to the shared cache tier; the job row only keeps its key
+    tts_lang = LANGUAGES[payload['language']].tts_code
+    audio_key = tts_audio_key(payload['text'], payload['language'])
+    shared_cache.set(audio_key, base64.b64encode(generate_speech(payload['text'], tts_lang)).decode('utf-8'))
+    return {'audio_key': audio_key}
+
+def run_document_translation_job(payload):
+    translated, segment_stats = translate_document(
+        payload['text'], payload['source_lang'], payload['target_lang'], translate_segment
+    )
+    return {'translated_text': translated, 'segments': segment_stats}
+
+job_queue.register('tts', run_tts_job)
+job_queue.register('document_translation', run_document_translation_job)
+job_queue.register('compact_history', lambda payload: compact_history(payload['older_than_days']))
+# Old history is moved out of the hot table in the background
+job_queue.add_periodic(
+    'compact_history',
+    RETENTION_INTERVAL_SECONDS,
+    lambda period: {'older_than_days': RETENTION_DAYS, 'period': period}
+)
+# Every process indexes new history for suggestions, a batch at a time
+job_queue.add_process_task(TM_SYNC_INTERVAL, translation_memory.sync)
+
+# Payload fields (and defaults) accepted for each job kind
+JOB_PAYLOAD_FIELDS = {
+    'tts': {'text': None, 'language': 'en'},
+    'document_translation': {'text': None, 'source_lang': 'auto', 'target_lang': 'en'},
+}
+# Speech this short is something the user is waiting on right now
+INTERACTIVE_JOB_CHARS = 500
+# Documents this long are bulk work
+BULK_JOB_CHARS = 20000
+# Interactive jobs a user may have queued or running at once
+MAX_INTERACTIVE_JOBS_PER_USER = 2
+
+def job_priority(kind, payload, user_id, requested=None):
+    """Lane for a client-submitted job, decided here and not by the client.
+
+    The client may only ask for a slower lane than the one its job gets.
+    """
+    if kind == 'tts' and len(payload['text']) <= INTERACTIVE_JOB_CHARS:
+        priority = 'interactive'
+    elif len(payload['text']) > BULK_JOB_CHARS:
+        priority = 'bulk'
+    else:
+        priority = 'normal'
+    if priority == 'interactive':
+        active = Job.query.filter(
+            Job.user_id == user_id,
+            Job.priority == PRIORITIES['interactive'],
+            Job.status.in_(('queued', 'running'))
+        ).count()
+        if active >= MAX_INTERACTIVE_JOBS_PER_USER:
+            priority = 'normal'
+    if requested in PRIORITIES and PRIORITIES[requested] > PRIORITIES[priority]:
+        priority = requested
+    return priority
+
+@app.before_request
+def start_job_workers():
+    # Workers are threads, so they are started per process after any fork
+    job_queue.ensure_started(app)
+
+@app.route('/api/jobs', methods=['POST', 'OPTIONS'])
+def submit_job():
+    if request.method == 'OPTIONS':
+        return '', 204
+        
+    # Only verify token for POST requests
+    @verify_clerk_token
+    def handle_submit_job():
+        try:
+            data = request.get_json()
+            kind = data.get('kind')
+            if kind not in JOB_PAYLOAD_FIELDS:
+                return jsonify({'error': f'Unknown job kind: {kind}'}), 400
+            payload = {
+                field: data.get(field, default)
+                for field, default in JOB_PAYLOAD_FIELDS[kind].items()
+            }
+            if not payload['text']:
+                return jsonify({'error': 'No text provided'}), 400
+            # Validate and normalize before queueing so bad jobs fail fast
+            if kind == 'tts':
+                payload['language'] = require(payload['language'], TTS).code
+            else:
+                source, target = require_translation_pair(payload['source_lang'], payload['target_lang'])
+                payload['source_lang'] = source if source == AUTO else source.code
+                payload['target_lang'] = target.code
+            
+            priority = job_priority(kind, payload, request.user.id, data.get('priority'))
+            job, created = job_queue.submit(
+                kind, payload, priority=priority, user_id=request.user.id
+            )
+            return jsonify({'job': job_to_dict(job), 'deduplicated': not created}), 202
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            print(f"Job submit error: {str(e)}")  # Debug log
+            return jsonify({'error': str(e)}), 500
+            
+    return handle_submit_job()
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+@verify_clerk_token
+def get_job_status(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or job.user_id != request.user.id:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job_to_dict(job)})
+
+@app.route('/api/jobs/<int:job_id>/result', methods=['GET'])
+@verify_clerk_token
+def get_job_result(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or job.user_id != request.user.id:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status == 'failed':
+        return jsonify({'job': job_to_dict(job), 'error': job.error}), 500
+    if job.status != 'done':
+        return jsonify({'job': job_to_dict(job)}), 409
+    result = json.loads(job.result)
+    if job.kind == 'tts':
+        result = shared_cache.get(result['audio_key'])
+        if result is None:
+            return jsonify({'job': job_to_dict(job), 'error': 'Audio expired, submit the job again'}), 410
+    return jsonify({'job': job_to_dict(job), 'result': result})
+
+@app.route('/api/jobs/warm-favorites', methods=['POST', 'OPTIONS'])
+def warm_favorites():
+    if request.method == 'OPTIONS':
+        return '', 204
+        
+    # Only verify token for POST requests
+    @verify_clerk_token
+    def handle_warm_favorites():
+        try:
+            favorites = Translation.query.filter_by(
+                user_id=request.user.id,
+                is_favorite=True
+            ).all()
+            # Bulk priority: never competes with interactive work
+            submitted = 0
+            for favorite in favorites:
+                try:
+                    tts_language = require(favorite.target_lang, TTS)
+                except UnsupportedLanguage:
+                    continue
+                _, created = job_queue.submit(
+                    'tts',
+                    {'text': favorite.translated_text, 'language': tts_language.code},
+                    priority='bulk',
+                    user_id=request.user.id
+                )
+                submitted += created
+            return jsonify({'favorites': len(favorites), 'submitted': submitted}), 202
+        except Exception as e:
+            print(f"Warm favorites error: {str(e)}")  # Debug log
+            return jsonify({'error': str(e)}), 500
+            
+    return handle_warm_favorites()
+
 @app.route('/api/detect-location', methods=['GET', 'OPTIONS'])
 def detect_location():
     if request.method == 'OPTIONS':
@@ -450,21 +978,10 @@ def detect_location():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Add languages list to match frontend
-languages = [
-    {'code': 'en', 'name': 'English'},
-    {'code': 'es', 'name': 'Spanish'},
-    {'code': 'fr', 'name': 'French'},
-    {'code': 'de', 'name': 'German'},
-    {'code': 'it', 'name': 'Italian'},
-    {'code': 'pt', 'name': 'Portuguese'},
-    {'code': 'ru', 'name': 'Russian'},
-    {'code': 'ja', 'name': 'Japanese'},
-    {'code': 'ko', 'name': 'Korean'},
-    {'code': 'zh', 'name': 'Chinese'},
-    {'code': 'ar', 'name': 'Arabic'},
-    {'code': 'hi', 'name': 'Hindi'},
-]
+@app.route('/api/languages', methods=['GET'])
+def get_languages():
+    # Served from the registry, so clients see exactly what the server accepts
+    return jsonify({'languages': capabilities()})
 
 @app.route('/api/auth/login', methods=['POST'])
 def login():
@@ -498,4 +1015,5 @@ if __name__ == '__main__':
     # Get port from environment variable or use default
     port = int(os.getenv('PORT', 10000))
     # Run on all interfaces (0.0.0.0) instead of just localhost
-    app.run(host='0.0.0.0', port=port, debug=True)
+    # Local development only; deployments go through wsgi.py (see gunicorn.conf.py)
+    app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_DEBUG', '1') == '1')
@@ -0,0 +1,107 @@
+"""Requests-per-second comparison: Flask dev server vs the gunicorn pool.
+
+    python bench_serving.py                 # both modes
+    python bench_serving.py gunicorn --concurrency 32 --duration 15
+
+Each mode is started as a subprocess on its own port and hammered with
+GET /api/detect-location (no auth, no upstream calls), so the numbers
+measure the serving stack rather than Google's APIs.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PATH = '/api/detect-location'
+
+MODES = {
+    # What render.yaml used to run: the single-process debug server
+    'dev': lambda port: [sys.executable, 'app.py'],
+    'gunicorn': lambda port: [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+}
+
+
+def wait_until_up(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.5)
+    raise RuntimeError(f'Server at {url} did not come up')
+
+
+def hammer(url, concurrency, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker():
+        session = requests.Session()
+        local = []
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                session.get(url, timeout=10).raise_for_status()
+                local.append(time.perf_counter() - started)
+            except requests.RequestException:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return {
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2) if latencies else None,
+        'errors': errors[0],
+    }
+
+
+def run_mode(mode, port, concurrency, duration):
+    env = dict(os.environ, PORT=str(port), FLASK_DEBUG='1')
+    server = subprocess.Popen(
+        MODES[mode](port), cwd=HERE, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        url = f'http://127.0.0.1:{port}{PATH}'
+        wait_until_up(url)
+        hammer(url, concurrency, 1)  # Warm-up
+        return hammer(url, concurrency, duration)
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modes', nargs='*', help=f"any of {', '.join(MODES)} (default: all)")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=18000)
+    args = parser.parse_args()
+    unknown = set(args.modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown mode(s): {', '.join(sorted(unknown))}")
+
+    for offset, mode in enumerate(args.modes or list(MODES)):
+        result = run_mode(mode, args.port + offset, args.concurrency, args.duration)
+        print(f'{mode:>9}: {result}')
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,10 @@ from langchain.chains import LLMChain
 from dotenv import load_dotenv
 from flask import Blueprint, request, jsonify
 from googletrans import Translator
+from semantic_cache import semantic_cache
+from languages import (
+    CHAT, DEFAULT_RECOMMENDATIONS, LANGUAGES, PURPOSE_RECOMMENDATIONS, UnsupportedLanguage, require
+)
 import random
 import os
 
@@ -100,15 +104,6 @@ CONVERSATION_TEMPLATES = {
     ]
 }
 
-# Language recommendations based on purpose
-LANGUAGE_RECOMMENDATIONS = {
-    'business': ['en', 'zh', 'es', 'de', 'ja'],
-    'travel': ['es', 'fr', 'it', 'de', 'ja'],
-    'education': ['en', 'fr', 'de', 'es', 'ru'],
-    'social': ['es', 'fr', 'it', 'pt', 'de'],
-    'technical': ['en', 'zh', 'ja', 'de', 'ru']
-}
-
 @chatbot_bp.route('/api/chatbot/start', methods=['POST'])
 def start_conversation():
     try:
@@ -118,14 +113,17 @@ def start_conversation():
         print(f"Starting conversation for purpose: {purpose}")  # Debug log
         
         # Get recommended language based on purpose
-        recommended_languages = LANGUAGE_RECOMMENDATIONS.get(purpose, ['en', 'es', 'fr'])
+        recommended_languages = PURPOSE_RECOMMENDATIONS.get(purpose, DEFAULT_RECOMMENDATIONS)
         recommended_lang = random.choice(recommended_languages)
         
         print(f"Recommended language: {recommended_lang}")  # Debug log
         
         try:
             # Get language name
-            lang_name = translator.translate('language', dest=recommended_lang).text
+            # googletrans spells region codes in lower case ('zh-cn')
+            lang_name = translator.translate(
+                'language', dest=LANGUAGES[recommended_lang].translation_code.lower()
+            ).text
             print(f"Translated language name: {lang_name}")  # Debug log
         except Exception as e:
             print(f"Translation error: {str(e)}")  # Debug log
@@ -176,17 +174,54 @@ def chat():
             
         data = request.get_json()
         user_message = data.get('message', '')
-        current_language = data.get('language', 'en')
+        try:
+            language = require(data.get('language', 'en'), CHAT)
+        except UnsupportedLanguage as e:
+            return jsonify({
+                'error': str(e),
+                'messages': [
+                    {'role': 'bot', 'content': 'Sorry, I cannot chat in that language yet.'}
+                ]
+            }), 400
+        current_language = language.code
+        
+        # Only a conversation's first question goes through the semantic cache;
+        # any later answer depends on the conversation so far
+        first_turn = bool(data.get('first_turn'))
+        if first_turn:
+            cached = semantic_cache.get(user_message, current_language)
+            if cached:
+                answer, similarity = cached
+                print(f"Semantic cache hit (similarity {similarity:.3f})")  # Debug log
+                # Keep the conversation memory consistent with what the user saw
+                memory.save_context({"input": user_message}, {"text": answer})
+                return jsonify({
+                    'messages': [
+                        {'role': 'bot', 'content': answer}
+                    ],
+                    'cached': True
+                })
         
         # Get response from the chatbot
-        response = conversation_chain.invoke(
-            {"input": user_message, "language": current_language}
-        )
+        if first_turn:
+            # Answered without any history, so the cached answer depends on
+            # the question alone whatever the client claimed
+            answer = (prompt | llm).invoke(
+                {"input": user_message, "language": language.name, "history": []}
+            ).content
+            memory.save_context({"input": user_message}, {"text": answer})
+            semantic_cache.set(user_message, current_language, answer)
+        else:
+            response = conversation_chain.invoke(
+                {"input": user_message, "language": language.name}
+            )
+            answer = response['text']
         
         return jsonify({
             'messages': [
-                {'role': 'bot', 'content': response['text']}
-            ]
+                {'role': 'bot', 'content': answer}
+            ],
+            'cached': False
         })
     except Exception as e:
         print(f"Chat error: {str(e)}")  # Debug log
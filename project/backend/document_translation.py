@@ -0,0 +1,178 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from shared_cache import shared_cache
+
+# Segment-level document translation. A document is split into paragraphs and
+# sentences, each segment is looked up in a content-hash cache and only the
+# misses go upstream, in parallel. The whitespace between segments is kept
+# verbatim so the output has the same layout as the input. Re-translating an
+# edited document only pays for the segments that changed.
+
+SEGMENT_CACHE_SIZE = int(os.getenv('SEGMENT_CACHE_SIZE', '20000'))
+SEGMENT_WORKERS = int(os.getenv('SEGMENT_WORKERS', '8'))
+
+# Paragraph breaks: a blank line, possibly with trailing spaces
+_paragraph_re = re.compile(r'(\n[ \t]*\n\s*)')
+# Candidate sentence ends: terminal punctuation (optionally closed by a quote
+# or bracket) followed by whitespace, or CJK terminal punctuation on its own
+_sentence_re = re.compile(r'[.!?…]["\'”’)\]]*\s+|[。！？]\s*')
+_word_before_period_re = re.compile(r'([\w.]+)\.$')
+# Words whose period does not end a sentence ("Dr. Smith", "e.g. this")
+_ABBREVIATIONS = {
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'mt', 'rev', 'gen', 'col',
+    'capt', 'lt', 'sgt', 'vs', 'no', 'nos', 'fig', 'vol', 'ch', 'p', 'pp',
+    'e.g', 'i.e', 'cf', 'approx', 'dept', 'est', 'inc', 'ltd', 'co', 'corp'
+}
+
+
+def _ends_sentence(paragraph, match):
+    if match.group()[0] not in '.!?…':
+        return True  # CJK punctuation is unambiguous
+    following = paragraph[match.end():match.end() + 1]
+    if following.islower():
+        return False  # "3 p.m. today": a new sentence starts with a capital
+    if not match.group().startswith('.'):
+        return True
+    word = _word_before_period_re.search(paragraph, 0, match.start() + 1)
+    if word is None:
+        return True
+    word = word.group(1)
+    if word.lower() in _ABBREVIATIONS:
+        return False
+    # An initial ("J. Smith"), but not the pronoun "I"
+    return not (len(word) == 1 and word.isalpha() and word != 'I')
+
+
+def split_segments(text):
+    """Split text into a list of (segment, separator) pairs.
+
+    Concatenating segment + separator for every pair gives back the original
+    text exactly. Segments never carry leading or trailing whitespace.
+    """
+    pieces = []
+    leading = text[:len(text) - len(text.lstrip())]
+    if leading:
+        pieces.append(('', leading))
+    body = text[len(leading):]
+
+    paragraphs = _paragraph_re.split(body)
+    # re.split with a capture group alternates paragraph, break, paragraph, ...
+    for i in range(0, len(paragraphs), 2):
+        paragraph = paragraphs[i]
+        paragraph_break = paragraphs[i + 1] if i + 1 < len(paragraphs) else ''
+        start = 0
+        for match in _sentence_re.finditer(paragraph):
+            if not _ends_sentence(paragraph, match):
+                continue
+            end = match.start() + len(match.group().rstrip())
+            pieces.append((paragraph[start:end], paragraph[end:match.end()]))
+            start = match.end()
+        tail = paragraph[start:]
+        stripped = tail.rstrip()
+        if stripped:
+            pieces.append((stripped, tail[len(stripped):] + paragraph_break))
+        elif pieces:
+            segment, separator = pieces[-1]
+            pieces[-1] = (segment, separator + tail + paragraph_break)
+        elif tail or paragraph_break:
+            pieces.append(('', tail + paragraph_break))
+    return pieces
+
+
+def segment_key(segment, source_lang, target_lang):
+    digest = hashlib.sha256(segment.encode('utf-8')).hexdigest()
+    return f'{source_lang}:{target_lang}:{digest}'
+
+
+class SegmentCache:
+    """Thread-safe LRU of segment hash -> translated segment.
+
+    Misses fall through to `shared` (the cross-worker tier) when given, and
+    hits there are promoted into this process's LRU.
+    """
+
+    def __init__(self, max_size=SEGMENT_CACHE_SIZE, shared=None):
+        self.max_size = max_size
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+        if self.shared is None:
+            return None
+        value = self.shared.get(f'segment:{key}')
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def set(self, key, value):
+        self._remember(key, value)
+        if self.shared is not None:
+            self.shared.set(f'segment:{key}', value)
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+segment_cache = SegmentCache(shared=shared_cache)
+_executor = ThreadPoolExecutor(max_workers=SEGMENT_WORKERS, thread_name_prefix='segment')
+
+
+def shutdown(wait=True):
+    _executor.shutdown(wait=wait)
+
+
+def translate_document(text, source_lang, target_lang, translate_segment, cache=None):
+    """Translate `text` segment by segment.
+
+    `translate_segment(segment, source_lang, target_lang)` is called only for
+    segments that are not cached yet; identical segments are translated once.
+    Returns (translated_text, stats).
+    """
+    if cache is None:
+        cache = segment_cache
+    pieces = split_segments(text)
+
+    translations = {}
+    missing = []
+    for segment, _ in pieces:
+        if not segment.strip() or segment in translations:
+            continue
+        cached = cache.get(segment_key(segment, source_lang, target_lang))
+        translations[segment] = cached
+        if cached is None:
+            missing.append(segment)
+
+    futures = {
+        segment: _executor.submit(translate_segment, segment, source_lang, target_lang)
+        for segment in missing
+    }
+    for segment, future in futures.items():
+        translated = future.result()
+        translations[segment] = translated
+        cache.set(segment_key(segment, source_lang, target_lang), translated)
+
+    output = ''.join(
+        (translations[segment] if segment.strip() else segment) + separator
+        for segment, separator in pieces
+    )
+    unique_segments = len(translations)
+    return output, {
+        'segments': unique_segments,
+        'cached_segments': unique_segments - len(missing),
+        'translated_segments': len(missing)
+    }
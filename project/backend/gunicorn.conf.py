@@ -0,0 +1,40 @@
+import os
+
+# Pre-forked worker pool for production. Every setting can be overridden
+# from the environment, e.g. WEB_CONCURRENCY=4 GUNICORN_THREADS=8.
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+# Threaded workers: requests mostly wait on upstream APIs, and WebSocket
+# sessions (/ws/interpret) hold a thread each
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+# Import the app once in the master before forking (see wsgi.py)
+preload_app = True
+# Upstream TTS/translation calls can be slow; don't kill workers mid-request
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+# On SIGTERM/redeploy, workers stop accepting and get this long to drain
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = 200
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    # Database connections opened in the master must not be shared by workers
+    from app import app
+    from models import db
+    with app.app_context():
+        db.engine.dispose()
+
+
+def worker_exit(server, worker):
+    # Let in-flight jobs, document segments and pipeline stages finish
+    import document_translation
+    import speech_pipeline
+    from jobs import job_queue
+    job_queue.shutdown(timeout=graceful_timeout)
+    document_translation.shutdown(wait=True)
+    speech_pipeline.shutdown(wait=True)
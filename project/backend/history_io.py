@@ -0,0 +1,180 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from languages import AUTO, require_translation_pair
+from models import db, Translation
+from retention import iter_archived
+
+# Streaming export/import of a user's translation history. Export reads the
+# archive one segment at a time, then walks the hot table in primary-key
+# order one batch at a time (keyset pagination), so memory stays flat
+# whatever the row count and no read transaction is held open between hot
+# batches. Import parses the request body as a stream, validates rows in
+# batches and inserts each valid batch with one executemany.
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 50
+EXPORT_FIELDS = [
+    'id', 'source_text', 'translated_text', 'source_lang', 'target_lang',
+    'created_at', 'is_favorite'
+]
+
+
+def iter_translations(user_id, batch_size=BATCH_SIZE):
+    # Archived rows first, by date; imported rows can make them newer than
+    # some hot rows, so the export as a whole is not in date order
+    yield from iter_archived(user_id)
+
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(
+                Translation.id,
+                Translation.source_text,
+                Translation.translated_text,
+                Translation.source_lang,
+                Translation.target_lang,
+                Translation.created_at,
+                Translation.is_favorite
+            ).where(
+                Translation.user_id == user_id,
+                Translation.id > last_id
+            ).order_by(Translation.id).limit(batch_size)
+        ).all()
+        # End the read transaction so writers are never blocked by an export
+        db.session.rollback()
+        if not rows:
+            return
+        for row in rows:
+            yield row
+        last_id = rows[-1].id
+
+
+def _row_to_dict(row):
+    return {
+        'id': row.id,
+        'source_text': row.source_text,
+        'translated_text': row.translated_text,
+        'source_lang': row.source_lang,
+        'target_lang': row.target_lang,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'is_favorite': bool(row.is_favorite)
+    }
+
+
+def export_ndjson(user_id):
+    buffer = []
+    for row in iter_translations(user_id):
+        buffer.append(json.dumps(_row_to_dict(row), ensure_ascii=False))
+        if len(buffer) >= BATCH_SIZE:
+            yield '\n'.join(buffer) + '\n'
+            buffer = []
+    if buffer:
+        yield '\n'.join(buffer) + '\n'
+
+
+def export_csv(user_id):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for count, row in enumerate(iter_translations(user_id), 1):
+        writer.writerow(_row_to_dict(row))
+        if count % BATCH_SIZE == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    if value in (None, ''):
+        return False
+    if str(value).lower() in ('true', '1', 'yes'):
+        return True
+    if str(value).lower() in ('false', '0', 'no'):
+        return False
+    raise ValueError(f'invalid is_favorite: {value!r}')
+
+
+def validate_row(record, user_id):
+    """Turn one imported record into Translation column values, or raise ValueError."""
+    if not isinstance(record, dict):
+        raise ValueError('row is not an object')
+    values = {'user_id': user_id}
+    for field in ('source_text', 'translated_text', 'target_lang'):
+        value = record.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f'missing {field}')
+        values[field] = value
+    # Stored with the registry's canonical codes, like live translations
+    source, target = require_translation_pair(record.get('source_lang') or AUTO, values['target_lang'])
+    values['source_lang'] = source if source == AUTO else source.code
+    values['target_lang'] = target.code
+
+    created_at = record.get('created_at')
+    try:
+        values['created_at'] = datetime.fromisoformat(created_at) if created_at else datetime.utcnow()
+    except (TypeError, ValueError):
+        raise ValueError(f'invalid created_at: {created_at!r}')
+    values['is_favorite'] = _parse_bool(record.get('is_favorite'))
+    return values
+
+
+def _iter_ndjson(stream):
+    for line in io.TextIOWrapper(stream, encoding='utf-8'):
+        line = line.strip()
+        if not line:
+            yield None  # Keeps row numbers aligned with lines
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ValueError(f'invalid JSON: {e.msg}')
+
+
+def _iter_csv(stream):
+    for record in csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', newline='')):
+        yield record
+
+
+def import_translations(user_id, stream, fmt):
+    """Validate and insert records read from a binary stream.
+
+    Rows are validated and inserted BATCH_SIZE at a time; an invalid row is
+    skipped and reported, it does not fail the rest. Returns a summary dict.
+    """
+    records = _iter_ndjson(stream) if fmt == 'ndjson' else _iter_csv(stream)
+    imported = 0
+    rejected = 0
+    errors = []
+    batch = []
+
+    def flush():
+        db.session.execute(db.insert(Translation), batch)
+        db.session.commit()
+
+    for row_number, record in enumerate(records, 1):
+        if record is None:
+            continue
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            batch.append(validate_row(record, user_id))
+        except ValueError as e:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'row': row_number, 'error': str(e)})
+            continue
+        if len(batch) >= BATCH_SIZE:
+            flush()
+            imported += len(batch)
+            batch = []
+    if batch:
+        flush()
+        imported += len(batch)
+
+    return {'imported': imported, 'rejected': rejected, 'errors': errors}
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from models import db, Job
+
+# Local background job queue. Jobs live in the `job` table, so they survive
+# restarts and every worker process sees the same queue. Worker threads claim
+# the highest-priority queued job with a conditional UPDATE, which is atomic
+# across processes. Some threads only ever take interactive jobs, so a burst
+# of bulk work (e.g. warming a user's favorites) cannot delay them.
+# Finished jobs are deleted JOB_RESULT_TTL after they finish, so the table
+# only holds recent work; bulky results such as TTS audio belong in the
+# shared cache tier, with only a reference in the job row.
+
+PRIORITIES = {
+    'interactive': 0,
+    'normal': 5,
+    'bulk': 10,
+}
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_INTERACTIVE_WORKERS = int(os.getenv('JOB_INTERACTIVE_WORKERS', '1'))
+# A running job not finished after this long is assumed lost and re-queued,
+# or failed once it has used up its attempts
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '600'))
+JOB_MAX_ATTEMPTS = 3
+# Done and failed jobs are deleted this long after they finish
+JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', str(24 * 3600)))
+POLL_INTERVAL = 1.0
+# How often the scheduler checks whether a periodic job is due
+SCHEDULER_TICK = 60
+
+
+def dedupe_key(kind, payload):
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f'{kind}:{canonical}'.encode('utf-8')).hexdigest()
+
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'priority': job.priority,
+        'attempts': job.attempts,
+        'error': job.error,
+        'created_at': job.created_at.strftime('%Y-%m-%d %H:%M:%S') if job.created_at else None,
+        'finished_at': job.finished_at.strftime('%Y-%m-%d %H:%M:%S') if job.finished_at else None,
+    }
+
+
+class JobQueue:
+    def __init__(self):
+        self._handlers = {}
+        self._periodic = []
+        self._process_tasks = []
+        self._app = None
+        self._pid = None
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def register(self, kind, handler):
+        """handler(payload) -> JSON-serializable result; raise to fail the job."""
+        self._handlers[kind] = handler
+
+    def add_periodic(self, kind, interval, payload_fn):
+        """Submit `kind` as a bulk job once every `interval` seconds.
+
+        payload_fn(period) builds the payload; the period number is part of
+        it, so deduplication leaves one job per period across all processes.
+        """
+        self._periodic.append((kind, interval, payload_fn))
+
+    def add_process_task(self, interval, task):
+        """Call task() from the scheduler thread of every process every `interval` seconds.
+
+        For per-process upkeep that the shared queue cannot do, since a
+        queued job runs in one process only. A truthy return means work is
+        left, and the task runs again right away.
+        """
+        self._process_tasks.append((interval, task))
+
+    def submit(self, kind, payload, priority='normal', user_id=None):
+        """Queue a job, or return the user's existing job for an identical one.
+
+        Returns (job, created).
+        """
+        if kind not in self._handlers:
+            raise ValueError(f'Unknown job kind: {kind}')
+        if priority not in PRIORITIES:
+            raise ValueError(f'Unknown priority: {priority}')
+        key = dedupe_key(kind, payload)
+        # A lost job must not absorb resubmissions
+        self._fail_expired()
+        existing = Job.query.filter(
+            Job.dedupe_key == key,
+            Job.user_id == user_id,
+            Job.status.in_(('queued', 'running', 'done'))
+        ).order_by(Job.id.desc()).first()
+        if existing:
+            # A more urgent resubmission promotes the queued job
+            if existing.status == 'queued' and PRIORITIES[priority] < existing.priority:
+                existing.priority = PRIORITIES[priority]
+                db.session.commit()
+            return existing, False
+
+        job = Job(
+            user_id=user_id,
+            kind=kind,
+            payload=json.dumps(payload),
+            priority=PRIORITIES[priority],
+            dedupe_key=key
+        )
+        db.session.add(job)
+        db.session.commit()
+        self._wakeup.set()
+        return job, True
+
+    def ensure_started(self, app):
+        """Start the worker threads once per process (safe to call per request)."""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._app = app
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = []
+            for i in range(JOB_INTERACTIVE_WORKERS + JOB_WORKERS):
+                max_priority = PRIORITIES['interactive'] if i < JOB_INTERACTIVE_WORKERS else None
+                thread = threading.Thread(
+                    target=self._work, args=(max_priority,), name=f'job-worker-{i}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            if self._periodic or self._process_tasks:
+                scheduler = threading.Thread(target=self._schedule, name='job-scheduler', daemon=True)
+                scheduler.start()
+                self._threads.append(scheduler)
+            print(f"Started {len(self._threads)} job workers in process {self._pid}")  # Debug log
+
+    def shutdown(self, timeout=30):
+        """Stop claiming new jobs and wait for running ones to finish."""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    def _schedule(self):
+        submitted_periods = {}
+        next_submit = 0.0
+        next_runs = [0.0] * len(self._process_tasks)
+        with self._app.app_context():
+            while not self._stopping.is_set():
+                if time.monotonic() >= next_submit:
+                    next_submit = time.monotonic() + SCHEDULER_TICK
+                    for kind, interval, payload_fn in self._periodic:
+                        period = int(time.time() // interval)
+                        if submitted_periods.get(kind) == period:
+                            continue
+                        try:
+                            self.submit(kind, payload_fn(period), priority='bulk')
+                            submitted_periods[kind] = period
+                        except Exception as e:
+                            print(f"Periodic job {kind} submit error: {str(e)}")  # Debug log
+                            db.session.rollback()
+                for i, (interval, task) in enumerate(self._process_tasks):
+                    if time.monotonic() < next_runs[i]:
+                        continue
+                    try:
+                        more = task()
+                    except Exception as e:
+                        print(f"Process task error: {str(e)}")  # Debug log
+                        db.session.rollback()
+                        more = False
+                    next_runs[i] = 0.0 if more else time.monotonic() + interval
+                db.session.remove()
+                self._stopping.wait(max(0.0, min([next_submit] + next_runs) - time.monotonic()))
+
+    def _fail_expired(self):
+        """Fail lost jobs (lease expired) that have no attempts left.
+
+        Without this they would stay 'running' forever: _claim() skips them.
+        """
+        now = datetime.utcnow()
+        failed = Job.query.filter(
+            Job.status == 'running',
+            Job.started_at < now - timedelta(seconds=JOB_LEASE_SECONDS),
+            Job.attempts >= JOB_MAX_ATTEMPTS
+        ).update({
+            'status': 'failed',
+            'error': 'Job lease expired after its last attempt',
+            'finished_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+        if failed:
+            print(f"Failed {failed} lost jobs with no attempts left")  # Debug log
+
+    def _prune_finished(self):
+        """Delete done and failed jobs that finished more than JOB_RESULT_TTL ago."""
+        pruned = Job.query.filter(
+            Job.status.in_(('done', 'failed')),
+            Job.finished_at < datetime.utcnow() - timedelta(seconds=JOB_RESULT_TTL)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if pruned:
+            print(f"Pruned {pruned} finished jobs")  # Debug log
+
+    def _claim(self, max_priority):
+        now = datetime.utcnow()
+        lease_expired = now - timedelta(seconds=JOB_LEASE_SECONDS)
+        query = Job.query.filter(
+            db.or_(
+                Job.status == 'queued',
+                db.and_(Job.status == 'running', Job.started_at < lease_expired)
+            ),
+            Job.attempts < JOB_MAX_ATTEMPTS
+        )
+        if max_priority is not None:
+            query = query.filter(Job.priority <= max_priority)
+        candidate = query.order_by(Job.priority, Job.created_at, Job.id).first()
+        if candidate is None:
+            return None
+        # Only one worker (in any process) wins this UPDATE
+        claimed = Job.query.filter(
+            Job.id == candidate.id,
+            Job.status == candidate.status,
+            Job.attempts == candidate.attempts
+        ).update({
+            'status': 'running',
+            'started_at': now,
+            'attempts': Job.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        return db.session.get(Job, candidate.id) if claimed else None
+
+    def _work(self, max_priority):
+        next_reap = 0.0
+        with self._app.app_context():
+            while not self._stopping.is_set():
+                try:
+                    job = self._claim(max_priority)
+                except Exception as e:
+                    print(f"Job claim error: {str(e)}")  # Debug log
+                    db.session.rollback()
+                    job = None
+                if job is None:
+                    if time.monotonic() >= next_reap:
+                        next_reap = time.monotonic() + SCHEDULER_TICK
+                        try:
+                            self._fail_expired()
+                            self._prune_finished()
+                        except Exception as e:
+                            print(f"Job reap error: {str(e)}")  # Debug log
+                            db.session.rollback()
+                    self._wakeup.wait(POLL_INTERVAL)
+                    self._wakeup.clear()
+                    continue
+                self._run(job)
+                db.session.remove()
+
+    def _run(self, job):
+        print(f"Running job {job.id} ({job.kind}, attempt {job.attempts})")  # Debug log
+        try:
+            result = self._handlers[job.kind](json.loads(job.payload))
+            job.result = json.dumps(result)
+            job.status = 'done'
+            job.error = None
+        except Exception as e:
+            print(f"Job {job.id} failed: {str(e)}")  # Debug log
+            job.error = str(e)
+            # Retried by the next free worker until attempts run out
+            job.status = 'queued' if job.attempts < JOB_MAX_ATTEMPTS else 'failed'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+job_queue = JobQueue()
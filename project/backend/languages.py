@@ -0,0 +1,159 @@
+from collections import namedtuple
+
+# Single registry of the languages VocaSync supports and what each provider
+# can do with them. Everything is precomputed at import time, so normalizing
+# a code and checking an operation is a dict lookup: unsupported requests are
+# rejected locally instead of after a slow upstream failure.
+#
+# The canonical code (the registry key) is what gets stored in translation
+# history and used in cache keys, so 'zh', 'zh-cn' and 'ZH-CN' all end up as
+# 'zh-CN'.
+
+Language = namedtuple('Language', [
+    'code',                # canonical code
+    'name',                # English name, also what the chatbot is told
+    'recognition_locale',  # speech_recognition / Google Speech locale
+    'translation_code',    # deep_translator GoogleTranslator code
+    'tts_code',            # gTTS language code
+])
+
+RECOGNITION = 'recognition'
+TRANSLATION = 'translation'
+TTS = 'tts'
+CHAT = 'chat'
+OPERATIONS = (RECOGNITION, TRANSLATION, TTS, CHAT)
+
+# Translation source that lets the provider detect the language
+AUTO = 'auto'
+
+LANGUAGES = {language.code: language for language in [
+    Language('en', 'English', 'en-US', 'en', 'en'),
+    Language('es', 'Spanish', 'es-ES', 'es', 'es'),
+    Language('fr', 'French', 'fr-FR', 'fr', 'fr'),
+    Language('de', 'German', 'de-DE', 'de', 'de'),
+    Language('it', 'Italian', 'it-IT', 'it', 'it'),
+    Language('pt', 'Portuguese', 'pt-BR', 'pt', 'pt'),
+    Language('ru', 'Russian', 'ru-RU', 'ru', 'ru'),
+    Language('ja', 'Japanese', 'ja-JP', 'ja', 'ja'),
+    Language('ko', 'Korean', 'ko-KR', 'ko', 'ko'),
+    Language('zh-CN', 'Chinese (Simplified)', 'zh-CN', 'zh-CN', 'zh-CN'),
+    Language('zh-TW', 'Chinese (Traditional)', 'zh-TW', 'zh-TW', 'zh-TW'),
+    Language('ar', 'Arabic', 'ar-SA', 'ar', 'ar'),
+    Language('hi', 'Hindi', 'hi-IN', 'hi', 'hi'),
+]}
+
+# Extra spellings clients send for the same language
+_ALIASES = {
+    'zh': 'zh-CN',
+    'zh-hans': 'zh-CN',
+    'zh-hant': 'zh-TW',
+    'zh-hk': 'zh-TW',
+    'chinese': 'zh-CN',
+}
+
+# Languages the chatbot recommends for each learning purpose
+PURPOSE_RECOMMENDATIONS = {
+    'business': ['en', 'zh-CN', 'es', 'de', 'ja'],
+    'travel': ['es', 'fr', 'it', 'de', 'ja'],
+    'education': ['en', 'fr', 'de', 'es', 'ru'],
+    'social': ['es', 'fr', 'it', 'pt', 'de'],
+    'technical': ['en', 'zh-CN', 'ja', 'de', 'ru'],
+}
+DEFAULT_RECOMMENDATIONS = ['en', 'es', 'fr']
+
+
+class UnsupportedLanguage(ValueError):
+    def __init__(self, code, operation):
+        self.code = code
+        self.operation = operation
+        super().__init__(f"Language '{code}' is not supported for {operation}")
+
+
+def _supports(language, operation):
+    if operation == CHAT:
+        return True  # The LLM is prompted with the language name
+    field = {
+        RECOGNITION: 'recognition_locale',
+        TRANSLATION: 'translation_code',
+        TTS: 'tts_code',
+    }[operation]
+    return getattr(language, field) is not None
+
+
+def _build_lookup():
+    lookup = {}
+    for language in LANGUAGES.values():
+        for spelling in (language.code, language.recognition_locale, language.name):
+            if spelling:
+                lookup[spelling.lower()] = language
+    for alias, code in _ALIASES.items():
+        lookup[alias] = LANGUAGES[code]
+    return lookup
+
+
+_LOOKUP = _build_lookup()
+_SUPPORTED = {
+    (spelling, operation): language
+    for spelling, language in _LOOKUP.items()
+    for operation in OPERATIONS
+    if _supports(language, operation)
+}
+
+for _codes in list(PURPOSE_RECOMMENDATIONS.values()) + [DEFAULT_RECOMMENDATIONS]:
+    assert all(code in LANGUAGES for code in _codes), _codes
+
+
+def get_language(code):
+    """Registry entry for any accepted spelling of a language, or None.
+
+    Region variants fall back to their base language ('en-GB' -> 'en').
+    """
+    if not isinstance(code, str) or not code:
+        return None
+    key = code.strip().replace('_', '-').lower()
+    language = _LOOKUP.get(key)
+    if language is None and '-' in key:
+        language = _LOOKUP.get(key.split('-', 1)[0])
+    return language
+
+
+def require(code, operation):
+    """Registry entry for `code` if it supports `operation`, else raise UnsupportedLanguage."""
+    language = get_language(code)
+    if language is None or (language.code.lower(), operation) not in _SUPPORTED:
+        raise UnsupportedLanguage(code, operation)
+    return language
+
+
+def require_translation_pair(source_lang, target_lang):
+    """Normalize a translation request. The source may be 'auto'.
+
+    Returns (source, target) where source is 'auto' or a Language.
+    """
+    if not source_lang or (isinstance(source_lang, str) and source_lang.strip().lower() == AUTO):
+        source = AUTO
+    else:
+        source = require(source_lang, TRANSLATION)
+    return source, require(target_lang, TRANSLATION)
+
+
+def recognition_locale(code):
+    """Locale to hand the recognizer. An explicit region the caller asked for
+    ('en-GB') is kept; a bare language gets the registry default."""
+    language = require(code, RECOGNITION)
+    requested = code.strip().replace('_', '-')
+    if '-' in requested and language.code != requested and \
+            requested.split('-', 1)[0].lower() == language.code.split('-', 1)[0].lower():
+        base, region = requested.split('-', 1)
+        return f'{base.lower()}-{region.upper()}'
+    return language.recognition_locale
+
+
+def capabilities():
+    """Registry contents for clients, in a stable order."""
+    return [{
+        'code': language.code,
+        'name': language.name,
+        'operations': [op for op in OPERATIONS if _supports(language, op)],
+        'recognition_locale': language.recognition_locale,
+    } for language in LANGUAGES.values()]
@@ -0,0 +1,224 @@
+import base64
+import os
+import queue
+import threading
+import time
+
+from speech_pipeline import SpeechSegmenter
+
+# Live interpretation sessions. The client streams raw PCM frames, the
+# segmenter closes utterances at pauses and a per-session worker turns each
+# one into a final transcript + translation (+ optional TTS audio). Clients
+# that opt in also get partial transcripts of the open utterance while the
+# worker is otherwise idle; each one is a full upstream recognition call, so
+# they are rate-limited, stop once the utterance grows long, and never run
+# while a final is waiting.
+#
+# Everything is bounded: the segment queue blocks the receive loop when the
+# worker falls behind (which stops reading the socket and pushes back on the
+# client), and the outbox drops stale partials before it ever blocks a final.
+# Once the client is gone (a send fails or it stops reading) the outbox is
+# closed, every later message is dropped and the worker stops, so no thread
+# ever waits on a dead connection.
+
+MAX_PENDING_SEGMENTS = int(os.getenv('LIVE_MAX_PENDING_SEGMENTS', '4'))
+MAX_OUTBOX_MESSAGES = int(os.getenv('LIVE_MAX_OUTBOX_MESSAGES', '32'))
+# Largest single audio frame accepted from the client
+MAX_FRAME_BYTES = 256 * 1024
+# How long a full segment queue may block the receive loop before giving up
+BACKPRESSURE_TIMEOUT = 10
+# How long finish() waits for the worker to translate the last utterances
+FINISH_TIMEOUT = 30
+# Minimum gap between two partial transcripts of the same utterance
+PARTIAL_INTERVAL_MS = 1000
+# Longer open utterances get no more partials, only their final
+PARTIAL_MAX_MS = 5000
+SAMPLE_WIDTHS = (1, 2, 4)
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+
+
+class SessionOverloaded(Exception):
+    pass
+
+
+def audio_format(sample_rate, sample_width):
+    """Validate the client's PCM format; returns (sample_rate, sample_width) or raises ValueError."""
+    try:
+        sample_rate, sample_width = int(sample_rate), int(sample_width)
+    except (TypeError, ValueError):
+        raise ValueError('sample_rate and sample_width must be integers')
+    if sample_width not in SAMPLE_WIDTHS:
+        raise ValueError(f'Unsupported sample_width {sample_width} (expected 1, 2 or 4 bytes)')
+    if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        raise ValueError(
+            f'Unsupported sample_rate {sample_rate} '
+            f'(expected {MIN_SAMPLE_RATE}-{MAX_SAMPLE_RATE} Hz)'
+        )
+    return sample_rate, sample_width
+
+
+def local_recognizer(segment, sample_rate, sample_width):
+    """Offline stand-in for recognize_google, for local testing."""
+    seconds = len(segment) / float(sample_rate * sample_width)
+    return f'[speech {seconds:.1f}s]'
+
+
+class Outbox:
+    """Bounded outbound message queue drained by a single sender thread."""
+
+    def __init__(self, max_size=MAX_OUTBOX_MESSAGES):
+        self._messages = queue.Queue(maxsize=max_size)
+        self._closed = threading.Event()
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+    def put(self, message):
+        """Queue a message. Returns False if it was dropped; never raises."""
+        if self._closed.is_set():
+            return False
+        try:
+            if message.get('type') == 'partial':
+                # A newer partial or the final supersedes this one anyway
+                self._messages.put_nowait(message)
+            else:
+                self._messages.put(message, timeout=BACKPRESSURE_TIMEOUT)
+        except queue.Full:
+            if message.get('type') != 'partial':
+                print("Live session client stopped reading, closing outbox")  # Debug log
+                self._closed.set()
+            return False
+        return True
+
+    def close(self):
+        """Stop accepting messages; drain() still sends what is already queued."""
+        self._closed.set()
+
+    def drain(self, send):
+        """Call send(message) for every message until close(); run on its own thread."""
+        while True:
+            try:
+                message = self._messages.get(timeout=PARTIAL_INTERVAL_MS / 1000)
+            except queue.Empty:
+                if self._closed.is_set():
+                    return
+                continue
+            try:
+                send(message)
+            except Exception as e:
+                print(f"Live session send error: {str(e)}")  # Debug log
+                self._closed.set()
+                return
+
+
+class LiveSession:
+    def __init__(self, outbox, recognize, translate, synthesize=None,
+                 sample_rate=16000, sample_width=2, partials=False):
+        self.outbox = outbox
+        self.recognize = recognize
+        self.translate = translate
+        self.synthesize = synthesize
+        self.partials = partials
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self._segmenter = SpeechSegmenter(sample_rate, sample_width)
+        self._segmenter_lock = threading.Lock()
+        self._segments = queue.Queue(maxsize=MAX_PENDING_SEGMENTS)
+        self._stopping = threading.Event()
+        self._segment_count = 0
+        self._last_partial_bytes = 0
+        self._last_partial_at = 0.0
+        self._worker = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._worker.start()
+        self.outbox.put({'type': 'ready'})
+
+    def feed_audio(self, data):
+        if len(data) > MAX_FRAME_BYTES:
+            raise ValueError(f'Audio frame too large ({len(data)} bytes)')
+        with self._segmenter_lock:
+            completed = self._segmenter.feed(data)
+        for segment in completed:
+            self._enqueue(segment)
+
+    def finish(self):
+        """Flush buffered speech, wait (bounded) for the worker, then close the outbox.
+
+        Never blocks indefinitely: with the client gone, buffered speech is
+        dropped and the worker stops after its current segment.
+        """
+        if not self.outbox.closed:
+            with self._segmenter_lock:
+                completed = self._segmenter.flush()
+            try:
+                for segment in completed:
+                    self._enqueue(segment)
+            except SessionOverloaded:
+                pass
+        self._stopping.set()
+        self._worker.join(timeout=FINISH_TIMEOUT)
+        self.outbox.put({'type': 'closed', 'segments': self._segment_count})
+        self.outbox.close()
+
+    def _enqueue(self, segment):
+        if self.outbox.closed:
+            return  # Nobody is listening for the result
+        try:
+            self._segments.put((time.perf_counter(), segment), timeout=BACKPRESSURE_TIMEOUT)
+        except queue.Full:
+            raise SessionOverloaded('Interpretation is falling behind the audio stream')
+
+    def _run(self):
+        while not self.outbox.closed:
+            try:
+                item = self._segments.get(timeout=PARTIAL_INTERVAL_MS / 1000)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                if self.partials:
+                    self._send_partial()
+                continue
+            closed_at, segment = item
+            try:
+                self._send_final(closed_at, segment)
+            except Exception as e:
+                print(f"Live session segment error: {str(e)}")  # Debug log
+                self.outbox.put({'type': 'error', 'segment': self._segment_count, 'error': str(e)})
+            self._segment_count += 1
+            self._last_partial_bytes = 0
+
+    def _send_partial(self):
+        with self._segmenter_lock:
+            segment = self._segmenter.current_segment()
+        if not segment or len(segment) == self._last_partial_bytes:
+            return
+        if len(segment) * 1000 > PARTIAL_MAX_MS * self.sample_rate * self.sample_width:
+            return
+        if not self._segments.empty():
+            return  # A final is waiting; it goes first
+        if (time.perf_counter() - self._last_partial_at) * 1000 < PARTIAL_INTERVAL_MS:
+            return
+        self._last_partial_bytes = len(segment)
+        self._last_partial_at = time.perf_counter()
+        try:
+            text = self.recognize(segment, self.sample_rate, self.sample_width)
+        except Exception as e:
+            print(f"Live session partial error: {str(e)}")  # Debug log
+            return
+        if text:
+            self.outbox.put({'type': 'partial', 'segment': self._segment_count, 'text': text})
+
+    def _send_final(self, closed_at, segment):
+        text = self.recognize(segment, self.sample_rate, self.sample_width)
+        message = {'type': 'final', 'segment': self._segment_count, 'text': text,
+                   'translated_text': None}
+        if text:
+            message['translated_text'] = self.translate(text)
+            if self.synthesize and message['translated_text']:
+                audio = self.synthesize(message['translated_text'])
+                message['audio_data'] = base64.b64encode(audio).decode('utf-8')
+        message['latency_ms'] = round((time.perf_counter() - closed_at) * 1000, 1)
+        self.outbox.put(message)
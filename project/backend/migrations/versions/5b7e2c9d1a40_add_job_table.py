@@ -0,0 +1,44 @@
+"""Add job table
+
+Revision ID: 5b7e2c9d1a40
+Revises: 16cd2aefa1f3
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2c9d1a40'
+down_revision = '16cd2aefa1f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('priority', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('dedupe_key', sa.String(length=64), nullable=False),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_job_dedupe_key', 'job', ['dedupe_key'], unique=False)
+    op.create_index('ix_job_status_priority', 'job', ['status', 'priority', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_job_status_priority', table_name='job')
+    op.drop_index('ix_job_dedupe_key', table_name='job')
+    op.drop_table('job')
@@ -0,0 +1,46 @@
+"""Add translation archive, aggregates and history index
+
+Revision ID: 9c4f1e7b2d63
+Revises: 5b7e2c9d1a40
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4f1e7b2d63'
+down_revision = '5b7e2c9d1a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_translation_user_created', 'translation', ['user_id', 'created_at'], unique=False)
+    op.create_table('translation_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('first_created_at', sa.DateTime(), nullable=False),
+    sa.Column('last_created_at', sa.DateTime(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_translation_archive_user_last', 'translation_archive', ['user_id', 'last_created_at'], unique=False)
+    op.create_table('translation_aggregate',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('target_lang', sa.String(length=10), nullable=False),
+    sa.Column('archived_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'target_lang')
+    )
+
+
+def downgrade():
+    op.drop_table('translation_aggregate')
+    op.drop_index('ix_translation_archive_user_last', table_name='translation_archive')
+    op.drop_table('translation_archive')
+    op.drop_index('ix_translation_user_created', table_name='translation')
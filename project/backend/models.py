@@ -29,5 +29,60 @@ class Translation(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_favorite = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        # Every dashboard query filters by user and (usually) by recency
+        db.Index('ix_translation_user_created', 'user_id', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<Translation {self.id}>'
+
+class TranslationArchive(db.Model):
+    # Append-only, zlib-compressed NDJSON segment of a user's old translations
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)
+    first_created_at = db.Column(db.DateTime, nullable=False)
+    last_created_at = db.Column(db.DateTime, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_translation_archive_user_last', 'user_id', 'last_created_at'),
+    )
+
+    def __repr__(self):
+        return f'<TranslationArchive {self.id} ({self.row_count} rows)>'
+
+class TranslationAggregate(db.Model):
+    # Per-user, per-target-language counts of archived rows, kept hot for stats
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    target_lang = db.Column(db.String(10), primary_key=True)
+    archived_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<TranslationAggregate {self.user_id} {self.target_lang}>'
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    # Lower runs first; see jobs.PRIORITIES
+    priority = db.Column(db.Integer, nullable=False, default=10)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    # Hash of kind + payload; identical submissions share one job
+    dedupe_key = db.Column(db.String(64), nullable=False, index=True)
+    result = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_job_status_priority', 'status', 'priority', 'created_at'),
+    )
+
     def __repr__(self):
-        return f'<Translation {self.id}>' 
\ No newline at end of file
+        return f'<Job {self.id} {self.kind} {self.status}>'
@@ -0,0 +1,181 @@
+import heapq
+import json
+import os
+import zlib
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+
+from models import db, Translation, TranslationArchive, TranslationAggregate
+
+# Tiered retention for translation history. Rows older than RETENTION_DAYS
+# are compacted into append-only, zlib-compressed NDJSON segments per user
+# (TranslationArchive) and removed from the hot `translation` table, so the
+# table and its indexes only hold recent rows and interactive queries do
+# not slow down as history grows. Favorites are never archived, and
+# per-language counts of archived rows stay hot in TranslationAggregate for
+# dashboard stats. Archived rows remain readable through iter_archived(),
+# but are no longer suggested by the translation memory, which only
+# suggests rows still in the hot table.
+
+# Never below one day: "translations today" is answered from the hot table
+RETENTION_DAYS = max(1, int(os.getenv('RETENTION_DAYS', '90')))
+RETENTION_INTERVAL_SECONDS = int(os.getenv('RETENTION_INTERVAL_SECONDS', '3600'))
+SEGMENT_MAX_ROWS = 5000
+_EPOCH = datetime(1970, 1, 1)
+
+ARCHIVED_FIELDS = [
+    'id', 'source_text', 'translated_text', 'source_lang', 'target_lang',
+    'created_at', 'is_favorite'
+]
+# Same attribute names as a Translation row, so readers need not care which tier it came from
+ArchivedTranslation = namedtuple('ArchivedTranslation', ARCHIVED_FIELDS)
+
+
+def _encode_segment(rows):
+    lines = [json.dumps({
+        'id': row.id,
+        'source_text': row.source_text,
+        'translated_text': row.translated_text,
+        'source_lang': row.source_lang,
+        'target_lang': row.target_lang,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+    }, ensure_ascii=False) for row in rows]
+    return zlib.compress('\n'.join(lines).encode('utf-8'), 6)
+
+
+def _decode_segment(data):
+    for line in zlib.decompress(data).decode('utf-8').split('\n'):
+        record = json.loads(line)
+        created_at = record['created_at']
+        yield ArchivedTranslation(
+            id=record['id'],
+            source_text=record['source_text'],
+            translated_text=record['translated_text'],
+            source_lang=record['source_lang'],
+            target_lang=record['target_lang'],
+            created_at=datetime.fromisoformat(created_at) if created_at else None,
+            is_favorite=False
+        )
+
+
+def _archivable(user_id, cutoff):
+    return Translation.query.filter(
+        Translation.user_id == user_id,
+        Translation.created_at < cutoff,
+        db.or_(Translation.is_favorite.is_(False), Translation.is_favorite.is_(None))
+    )
+
+
+def _archive_segment(user_id, cutoff):
+    """Move one segment's worth of a user's old rows into the archive.
+
+    Returns the number of rows archived (0 when nothing is left).
+    """
+    rows = _archivable(user_id, cutoff).order_by(Translation.id).limit(SEGMENT_MAX_ROWS).all()
+    if not rows:
+        return 0
+
+    db.session.add(TranslationArchive(
+        user_id=user_id,
+        row_count=len(rows),
+        first_created_at=min(row.created_at for row in rows),
+        last_created_at=max(row.created_at for row in rows),
+        data=_encode_segment(rows)
+    ))
+    for target_lang, count in Counter(row.target_lang for row in rows).items():
+        aggregate = db.session.get(TranslationAggregate, (user_id, target_lang))
+        if aggregate is None:
+            aggregate = TranslationAggregate(user_id=user_id, target_lang=target_lang, archived_count=0)
+            db.session.add(aggregate)
+        aggregate.archived_count += count
+
+    ids = [row.id for row in rows]
+    deleted = Translation.query.filter(Translation.id.in_(ids)).delete(synchronize_session=False)
+    if deleted != len(ids):
+        # Another compaction got to some of these rows first; don't archive twice
+        db.session.rollback()
+        return 0
+    # Segment, aggregates and delete commit together
+    db.session.commit()
+    return len(ids)
+
+
+def compact_history(older_than_days=RETENTION_DAYS):
+    """Archive every user's non-favorite rows older than `older_than_days`."""
+    cutoff = datetime.utcnow() - timedelta(days=max(1, older_than_days))
+    user_ids = [user_id for (user_id,) in db.session.query(Translation.user_id).filter(
+        Translation.created_at < cutoff
+    ).distinct().all()]
+
+    archived = 0
+    segments = 0
+    for user_id in user_ids:
+        while True:
+            count = _archive_segment(user_id, cutoff)
+            if not count:
+                break
+            archived += count
+            segments += 1
+    print(f"History compaction: {archived} rows into {segments} segments")  # Debug log
+    return {'archived_rows': archived, 'segments': segments, 'users': len(user_ids)}
+
+
+def _precedes(row, newest_first, created_at, row_id=None):
+    """Whether `row` comes before the (created_at, row_id) position in iteration order."""
+    if row.created_at != created_at or row_id is None:
+        return row.created_at > created_at if newest_first else row.created_at < created_at
+    return row.id > row_id if newest_first else row.id < row_id
+
+
+def iter_archived(user_id, newest_first=False, before=None, before_id=None):
+    """Yield a user's archived rows in created_at order (then id), one segment at a time.
+
+    Segments can overlap in time (imported rows carry old dates but are
+    archived late), so segments are opened in order of their bounds and rows
+    are merged: a row is yielded once no unopened segment can hold a row
+    that sorts before it. With `before` (and `before_id` for rows sharing
+    that timestamp) only older rows are yielded, and segments that only hold
+    newer rows are not even decompressed.
+    """
+    query = db.session.query(
+        TranslationArchive.id, TranslationArchive.first_created_at, TranslationArchive.last_created_at
+    ).filter(TranslationArchive.user_id == user_id)
+    if before is not None:
+        query = query.filter(TranslationArchive.first_created_at <= before)
+    if newest_first:
+        query = query.order_by(TranslationArchive.last_created_at.desc(), TranslationArchive.id.desc())
+    else:
+        query = query.order_by(TranslationArchive.first_created_at, TranslationArchive.id)
+    segments = query.all()
+
+    def sort_key(row):
+        seconds = (row.created_at - _EPOCH).total_seconds()
+        return (-seconds, -row.id) if newest_first else (seconds, row.id)
+
+    pending = []
+    for segment in segments:
+        # Rows in this and later segments are no newer than its last row
+        # (no older than its first with ascending order)
+        bound = segment.last_created_at if newest_first else segment.first_created_at
+        while pending and _precedes(pending[0][1], newest_first, bound):
+            yield heapq.heappop(pending)[1]
+        data = db.session.query(TranslationArchive.data).filter(
+            TranslationArchive.id == segment.id
+        ).scalar()
+        for row in _decode_segment(data):
+            if before is None or _precedes(row, False, before, before_id):
+                heapq.heappush(pending, (sort_key(row), row))
+    while pending:
+        yield heapq.heappop(pending)[1]
+
+
+def newest_archived_at(user_id):
+    return db.session.query(db.func.max(TranslationArchive.last_created_at)).filter(
+        TranslationArchive.user_id == user_id
+    ).scalar()
+
+
+def archived_languages_query(user_id):
+    return db.session.query(TranslationAggregate.target_lang).filter(
+        TranslationAggregate.user_id == user_id
+    )
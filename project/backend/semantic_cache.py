@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from shared_cache import shared_cache
+
+# Semantic response cache for first-turn chatbot questions. Questions are
+# embedded locally with a hashing vectorizer (word unigrams/bigrams plus
+# character trigrams of the non-function words, signed feature hashing,
+# L2-normalized) so no model or network call is needed. Each language has its
+# own embedding matrix, grown by doubling up to the size bound.
+#
+# Similarity alone cannot tell "5 pm" from "9 pm" or "coffee" from "tea", so
+# an entry is only a candidate when the question's key terms (content words,
+# numbers and quoted phrases) are exactly the same; the similarity threshold
+# then only has to catch word order, and function words, casing and
+# punctuation may differ freely.
+
+EMBEDDING_DIM = 2 ** 10
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.9'))
+SEMANTIC_CACHE_TTL = int(os.getenv('SEMANTIC_CACHE_TTL', str(24 * 3600)))
+# Entries per language partition
+SEMANTIC_CACHE_SIZE = int(os.getenv('SEMANTIC_CACHE_SIZE', '5000'))
+# Questions kept per key-terms group in the shared tier
+SHARED_ENTRIES_PER_KEY = 8
+
+_token_re = re.compile(r'\w+', re.UNICODE)
+_quoted_re = re.compile(r'"([^"]+)"|“([^”]+)”|\'([^\']+)\'(?!\w)')
+
+# Function words that can differ between two phrasings of the same question
+_STOPWORDS = {
+    'a', 'an', 'the', 'i', 'you', 'we', 'me', 'my', 'your', 'do', 'does', 'did',
+    'can', 'could', 'would', 'will', 'is', 'are', 'am', 'be', 'to', 'of',
+    'please', 'there'
+}
+
+
+def key_terms(text):
+    """Everything in a question that must match exactly for a cached answer to apply."""
+    quoted = [next(group for group in match.groups() if group) for match in _quoted_re.finditer(text)]
+    tokens = _token_re.findall(text.lower())
+    terms = sorted({token for token in tokens if token not in _STOPWORDS})
+    return '\x1f'.join(terms + ['"' + phrase.strip().lower() for phrase in sorted(quoted)])
+
+
+def _feature(feature):
+    digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+    value = int.from_bytes(digest, 'little')
+    # Low bits pick the bucket, one high bit picks the sign
+    return value % EMBEDDING_DIM, 1.0 if value >> 63 else -1.0
+
+
+def embed(text):
+    # Function words are left out, like in key_terms(), so rephrasings embed alike
+    tokens = [token for token in _token_re.findall(text.lower()) if token not in _STOPWORDS]
+    features = list(tokens)
+    features += [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+    joined = f" {' '.join(tokens)} "
+    features += [f'#{joined[i:i + 3]}' for i in range(len(joined) - 2)]
+
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for feature in features:
+        index, sign = _feature(feature)
+        vector[index] += sign
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+class _Partition:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.vectors = np.zeros((min(capacity, 64), EMBEDDING_DIM), dtype=np.float32)
+        self.created_at = np.zeros(len(self.vectors))
+        self.last_used = np.zeros(len(self.vectors))
+        self.questions = []
+        self.answers = []
+        self.keys = []
+        self.slots_by_key = {}  # key terms -> slots holding questions with them
+        self.size = 0
+
+    def free_slot(self, now, ttl):
+        if self.size < self.capacity:
+            if self.size == len(self.vectors):
+                grown = min(self.capacity, self.size * 2)
+                self.vectors = np.resize(self.vectors, (grown, EMBEDDING_DIM))
+                self.created_at = np.resize(self.created_at, grown)
+                self.last_used = np.resize(self.last_used, grown)
+            self.questions.append(None)
+            self.answers.append(None)
+            self.keys.append(None)
+            self.size += 1
+            return self.size - 1
+        # Full: reuse an expired slot if there is one, else the least recently used
+        expired = np.flatnonzero(self.created_at < now - ttl)
+        if len(expired):
+            return int(expired[0])
+        return int(np.argmin(self.last_used))
+
+    def closest(self, key, vector, created_after=None):
+        """(slot, similarity) of the closest question with the same key terms, or None."""
+        slots = self.slots_by_key.get(key)
+        if not slots:
+            return None
+        slots = np.fromiter(slots, dtype=np.int64, count=len(slots))
+        similarities = self.vectors[slots] @ vector
+        if created_after is not None:
+            # Expired entries never match; their slots get reused on insert
+            similarities[self.created_at[slots] < created_after] = -1.0
+        best = int(np.argmax(similarities))
+        return int(slots[best]), float(similarities[best])
+
+    def store(self, slot, key, vector, question, answer, created_at, now):
+        previous = self.keys[slot]
+        if previous is not None:
+            self.slots_by_key[previous].discard(slot)
+            if not self.slots_by_key[previous]:
+                del self.slots_by_key[previous]
+        self.slots_by_key.setdefault(key, set()).add(slot)
+        self.keys[slot] = key
+        self.vectors[slot] = vector
+        self.questions[slot] = question
+        self.answers[slot] = answer
+        self.created_at[slot] = created_at
+        self.last_used[slot] = now
+
+
+class SemanticCache:
+    """Per-process semantic cache, optionally backed by the cross-worker tier.
+
+    Shared entries are grouped under the question's key terms, since only
+    questions with identical key terms can ever match; a local miss reads
+    that one group and promotes a match into this process's partition.
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, ttl=SEMANTIC_CACHE_TTL,
+                 capacity=SEMANTIC_CACHE_SIZE, shared=None):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.capacity = capacity
+        self.shared = shared
+        self._partitions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, question, language):
+        """Return (answer, similarity) for the closest fresh question, or None."""
+        key = key_terms(question)
+        vector = embed(question)
+        now = time.time()
+        with self._lock:
+            partition = self._partitions.get(language)
+            match = partition.closest(key, vector, now - self.ttl) if partition else None
+            if match is not None and match[1] >= self.threshold:
+                slot, similarity = match
+                partition.last_used[slot] = now
+                self.hits += 1
+                return partition.answers[slot], similarity
+
+        match = self._shared_closest(key, vector, language, now)
+        with self._lock:
+            if match is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        shared_question, answer, created_at, similarity = match
+        self._store(shared_question, language, answer, key, embed(shared_question), created_at)
+        return answer, similarity
+
+    def set(self, question, language, answer):
+        """Cache an answer. Only for answers produced without conversation history."""
+        key = key_terms(question)
+        now = time.time()
+        self._store(question, language, answer, key, embed(question), now)
+        if self.shared is not None:
+            shared_key = self._shared_key(key, language)
+            entries = self._shared_entries(shared_key, now)
+            entries = [entry for entry in entries if entry[0] != question][-(SHARED_ENTRIES_PER_KEY - 1):]
+            entries.append([question, answer, now])
+            self.shared.set(shared_key, json.dumps(entries, ensure_ascii=False), ttl=self.ttl)
+
+    def _store(self, question, language, answer, key, vector, created_at):
+        now = time.time()
+        with self._lock:
+            partition = self._partitions.get(language)
+            if partition is None:
+                partition = self._partitions[language] = _Partition(self.capacity)
+            # Re-asking the same question refreshes its entry in place
+            match = partition.closest(key, vector)
+            if match is not None and match[1] >= 0.999:
+                slot = match[0]
+            else:
+                slot = partition.free_slot(now, self.ttl)
+            partition.store(slot, key, vector, question, answer, created_at, now)
+
+    def _shared_key(self, key, language):
+        digest = hashlib.sha256(f'{language}\x1f{key}'.encode('utf-8')).hexdigest()
+        return f'semantic:{digest}'
+
+    def _shared_entries(self, shared_key, now):
+        # [question, answer, created_at] lists, freshest last
+        value = self.shared.get(shared_key)
+        if value is None:
+            return []
+        return [entry for entry in json.loads(value) if entry[2] >= now - self.ttl]
+
+    def _shared_closest(self, key, vector, language, now):
+        if self.shared is None:
+            return None
+        best = None
+        for shared_question, answer, created_at in self._shared_entries(self._shared_key(key, language), now):
+            similarity = float(embed(shared_question) @ vector)
+            if similarity >= self.threshold and (best is None or similarity > best[3]):
+                best = (shared_question, answer, created_at, similarity)
+        return best
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': {language: p.size for language, p in self._partitions.items()}
+            }
+
+
+semantic_cache = SemanticCache(shared=shared_cache)
@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Cache tier shared by every worker process on the host. It is a plain SQLite
+# file in WAL mode, so readers never block each other and one worker's
+# result is visible to all the others. Per-process caches sit in front of it
+# as the fast first tier.
+
+SHARED_CACHE_PATH = os.getenv(
+    'SHARED_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'vocasync-cache.sqlite3')
+)
+SHARED_CACHE_TTL = int(os.getenv('SHARED_CACHE_TTL', str(7 * 24 * 3600)))
+SHARED_CACHE_MAX_ENTRIES = int(os.getenv('SHARED_CACHE_MAX_ENTRIES', '200000'))
+# Expired/overflow rows are trimmed once every this many writes
+PRUNE_EVERY = 1000
+
+
+class SharedCache:
+    def __init__(self, path=SHARED_CACHE_PATH, ttl=SHARED_CACHE_TTL,
+                 max_entries=SHARED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        # Connections are per thread and opened lazily, so they are always
+        # created after a pre-fork server has forked its workers
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        try:
+            row = self._connection().execute(
+                'SELECT value FROM cache WHERE key = ? AND expires_at > ?', (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Shared cache read error: {str(e)}")  # Debug log
+            return None
+        return row[0] if row else None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (ttl if ttl is not None else self.ttl)
+        try:
+            connection = self._connection()
+            connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, value, expires_at)
+            )
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0:
+                self.prune(connection)
+        except sqlite3.Error as e:
+            # The shared tier is an optimization; a failed write is not an error
+            print(f"Shared cache write error: {str(e)}")  # Debug log
+
+    def prune(self, connection=None):
+        connection = connection or self._connection()
+        connection.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+        # Over the size bound: drop the entries closest to expiry
+        connection.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY expires_at LIMIT max(0, '
+            '(SELECT count(*) FROM cache) - ?))',
+            (self.max_entries,)
+        )
+
+
+shared_cache = SharedCache()
@@ -0,0 +1,142 @@
+import audioop
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Speech-to-speech pipeline: recognition -> translation -> synthesis in one
+# server-side pass. Audio is cut into utterances at pauses so every segment
+# runs its own chain on a worker; segment N is translated and synthesized
+# while segment N+1 is still being transcribed.
+
+PIPELINE_WORKERS = int(os.getenv('PIPELINE_WORKERS', '4'))
+# Segmentation works on short analysis windows of raw PCM
+WINDOW_MS = 30
+# RMS energy below this counts as silence (same scale as Recognizer.energy_threshold)
+SILENCE_THRESHOLD = int(os.getenv('SILENCE_THRESHOLD', '300'))
+# A pause this long after speech closes a segment
+MIN_SILENCE_MS = 500
+# Segments are closed at this length even without a pause
+MAX_SEGMENT_MS = 15000
+# Segments with less speech than this are noise, not words
+MIN_SPEECH_MS = 150
+
+_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix='pipeline')
+
+
+def shutdown(wait=True):
+    _executor.shutdown(wait=wait)
+
+
+class SpeechSegmenter:
+    """Energy-based utterance segmentation over a stream of raw PCM bytes.
+
+    feed() accepts arbitrarily sized chunks and returns the segments completed
+    so far; flush() returns whatever speech is still buffered.
+    """
+
+    def __init__(self, sample_rate, sample_width):
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.window_bytes = int(sample_rate * WINDOW_MS / 1000) * sample_width
+        self._pending = b''  # bytes not yet forming a full window
+        self._segment = bytearray()
+        self._speech_ms = 0
+        self._silence_ms = 0
+
+    def feed(self, data):
+        completed = []
+        data = self._pending + data
+        usable = len(data) - len(data) % self.window_bytes
+        self._pending = data[usable:]
+        for offset in range(0, usable, self.window_bytes):
+            window = data[offset:offset + self.window_bytes]
+            is_speech = audioop.rms(window, self.sample_width) >= SILENCE_THRESHOLD
+            if is_speech:
+                self._speech_ms += WINDOW_MS
+                self._silence_ms = 0
+            elif self._speech_ms:
+                self._silence_ms += WINDOW_MS
+            elif not self._segment:
+                continue  # Skip leading silence entirely
+            self._segment.extend(window)
+
+            segment_ms = len(self._segment) // self.window_bytes * WINDOW_MS
+            if self._silence_ms >= MIN_SILENCE_MS or segment_ms >= MAX_SEGMENT_MS:
+                segment = self._close()
+                if segment:
+                    completed.append(segment)
+        return completed
+
+    def flush(self):
+        self._segment.extend(self._pending)
+        self._pending = b''
+        segment = self._close()
+        return [segment] if segment else []
+
+    def current_segment(self):
+        """The open segment so far, once it holds enough speech to be worth a look."""
+        if self._speech_ms < MIN_SPEECH_MS:
+            return None
+        return bytes(self._segment)
+
+    def _close(self):
+        segment = bytes(self._segment)
+        speech_ms = self._speech_ms
+        self._segment = bytearray()
+        self._speech_ms = 0
+        self._silence_ms = 0
+        if speech_ms < MIN_SPEECH_MS:
+            return None
+        return segment
+
+
+def _run_segment(index, segment, recognize, translate, synthesize):
+    timings = {}
+    started = time.perf_counter()
+    text = recognize(segment)
+    timings['recognition_ms'] = (time.perf_counter() - started) * 1000
+
+    result = {'index': index, 'text': text, 'translated_text': None, 'audio': None}
+    if not text:
+        return result, timings
+
+    started = time.perf_counter()
+    result['translated_text'] = translate(text)
+    timings['translation_ms'] = (time.perf_counter() - started) * 1000
+
+    if synthesize and result['translated_text']:
+        started = time.perf_counter()
+        result['audio'] = synthesize(result['translated_text'])
+        timings['synthesis_ms'] = (time.perf_counter() - started) * 1000
+    return result, timings
+
+
+def run_pipeline(raw_data, sample_rate, sample_width, recognize, translate, synthesize=None):
+    """Run speech -> text -> translation -> speech over a finished recording.
+
+    `recognize(segment_bytes)` returns the transcript of one PCM segment (or
+    None when nothing was understood), `translate(text)` the translated text,
+    and `synthesize(text)` audio bytes; pass synthesize=None to skip TTS.
+    Returns (segments, timings) with segments in audio order. Stage timings
+    are summed over segments; `total_ms` is wall-clock time.
+    """
+    started = time.perf_counter()
+    segmenter = SpeechSegmenter(sample_rate, sample_width)
+    segments = segmenter.feed(raw_data) + segmenter.flush()
+
+    futures = [
+        _executor.submit(_run_segment, index, segment, recognize, translate, synthesize)
+        for index, segment in enumerate(segments)
+    ]
+    results = []
+    timings = {'recognition_ms': 0.0, 'translation_ms': 0.0, 'synthesis_ms': 0.0}
+    for future in futures:
+        result, segment_timings = future.result()
+        results.append(result)
+        for stage, elapsed in segment_timings.items():
+            timings[stage] += elapsed
+
+    timings = {stage: round(elapsed, 1) for stage, elapsed in timings.items()}
+    timings['segments'] = len(segments)
+    timings['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return results, timings
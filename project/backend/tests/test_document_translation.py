@@ -0,0 +1,21 @@
+import pytest
+
+from document_translation import split_segments
+
+
+@pytest.mark.parametrize('text, segments', [
+    ('Dr. Smith arrived at 3 p.m. today.', ['Dr. Smith arrived at 3 p.m. today.']),
+    ('Ask Mr. J. R. Tolkien. He knows.', ['Ask Mr. J. R. Tolkien.', 'He knows.']),
+    ('Use e.g. this one. Or that one!', ['Use e.g. this one.', 'Or that one!']),
+    ('So do I. Then we left.', ['So do I.', 'Then we left.']),
+    ('It costs 5 dollars. 2 people paid.', ['It costs 5 dollars.', '2 people paid.']),
+    ('He said "Stop." Then he ran.', ['He said "Stop."', 'Then he ran.']),
+    ('你好。再见', ['你好。', '再见']),
+])
+def test_sentence_boundaries(text, segments):
+    assert [segment for segment, _ in split_segments(text)] == segments
+
+
+def test_layout_round_trips():
+    text = '  Title\n\nDr. Smith came.  He left.\n\n\n  Last line. \n'
+    assert ''.join(segment + separator for segment, separator in split_segments(text)) == text
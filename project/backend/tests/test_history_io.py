@@ -0,0 +1,85 @@
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from history_io import export_csv, export_ndjson, import_translations, validate_row
+from models import db, Translation
+
+
+def record(**overrides):
+    values = {
+        'source_text': 'Good morning',
+        'translated_text': 'Bonjour',
+        'source_lang': 'en',
+        'target_lang': 'fr',
+        'created_at': '2024-03-01T09:30:00',
+        'is_favorite': False,
+    }
+    values.update(overrides)
+    return values
+
+
+def test_valid_row_gets_canonical_codes():
+    values = validate_row(record(source_lang='EN', target_lang='zh', is_favorite='yes'), 7)
+    assert values['user_id'] == 7
+    assert (values['source_lang'], values['target_lang']) == ('en', 'zh-CN')
+    assert values['created_at'] == datetime(2024, 3, 1, 9, 30)
+    assert values['is_favorite'] is True
+    assert validate_row(record(source_lang=None), 7)['source_lang'] == 'auto'
+
+
+@pytest.mark.parametrize('bad, error', [
+    ('not an object', 'row is not an object'),
+    (record(source_text='  '), 'missing source_text'),
+    (record(translated_text=None), 'missing translated_text'),
+    (record(target_lang='xx'), "Language 'xx' is not supported for translation"),
+    (record(source_lang='klingon'), "Language 'klingon' is not supported for translation"),
+    (record(target_lang=5), 'missing target_lang'),
+    (record(created_at='yesterday'), "invalid created_at: 'yesterday'"),
+    (record(created_at=20240301), 'invalid created_at: 20240301'),
+    (record(is_favorite='maybe'), "invalid is_favorite: 'maybe'"),
+])
+def test_invalid_rows_are_rejected(bad, error):
+    with pytest.raises(ValueError) as raised:
+        validate_row(bad, 7)
+    assert str(raised.value) == error
+
+
+def test_bad_json_lines_are_reported_without_failing_the_import(app_context):
+    body = '\n'.join([
+        json.dumps(record()),
+        '{"source_text": ',
+        '',
+        json.dumps(record(target_lang='xx')),
+        json.dumps(record(source_text='Good night', translated_text='Bonne nuit')),
+    ]).encode('utf-8')
+
+    summary = import_translations(1, io.BytesIO(body), 'ndjson')
+    assert summary['imported'] == 2 and summary['rejected'] == 2
+    assert [error['row'] for error in summary['errors']] == [2, 4]
+    assert summary['errors'][0]['error'].startswith('invalid JSON')
+
+
+def history(user_id):
+    rows = Translation.query.filter_by(user_id=user_id).order_by(Translation.id).all()
+    return [(row.source_text, row.translated_text, row.source_lang, row.target_lang,
+             row.created_at, bool(row.is_favorite)) for row in rows]
+
+
+@pytest.mark.parametrize('fmt, export', [('ndjson', export_ndjson), ('csv', export_csv)])
+def test_export_import_round_trip(app_context, fmt, export):
+    db.session.add_all([
+        Translation(user_id=1, source_text='Good morning', translated_text='Bonjour',
+                    source_lang='en', target_lang='fr', created_at=datetime(2024, 3, 1, 9, 30)),
+        Translation(user_id=1, source_text='Hello, "friend"\nbye', translated_text='你好，朋友',
+                    source_lang='auto', target_lang='zh-CN', created_at=datetime(2024, 3, 2, 10, 0, 5, 123),
+                    is_favorite=True),
+    ])
+    db.session.commit()
+
+    exported = ''.join(export(1)).encode('utf-8')
+    summary = import_translations(2, io.BytesIO(exported), fmt)
+    assert summary == {'imported': 2, 'rejected': 0, 'errors': []}
+    assert history(2) == history(1)
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import jobs
+from jobs import JOB_MAX_ATTEMPTS, JobQueue, dedupe_key
+from models import db, Job
+
+
+@pytest.fixture
+def queue(app_context):
+    job_queue = JobQueue()
+    job_queue.register('echo', lambda payload: payload)
+    return job_queue
+
+
+def lost_job(attempts):
+    job = Job(
+        kind='echo', payload='{"text": "hi"}', priority=0, status='running',
+        dedupe_key=dedupe_key('echo', {'text': 'hi'}), attempts=attempts,
+        started_at=datetime.utcnow() - timedelta(seconds=jobs.JOB_LEASE_SECONDS + 1)
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def test_lost_job_without_attempts_left_fails(queue):
+    job = lost_job(JOB_MAX_ATTEMPTS)
+    assert queue._claim(None) is None
+    queue._fail_expired()
+    assert db.session.get(Job, job.id).status == 'failed'
+
+
+def test_resubmission_does_not_attach_to_a_lost_job(queue):
+    job = lost_job(JOB_MAX_ATTEMPTS)
+    resubmitted, created = queue.submit('echo', {'text': 'hi'})
+    assert created and resubmitted.id != job.id
+
+
+def test_lost_job_with_attempts_left_is_retried(queue):
+    job = lost_job(1)
+    claimed = queue._claim(None)
+    assert claimed.id == job.id and claimed.attempts == 2
+
+
+def test_process_task_reruns_while_work_is_left(queue, app_context):
+    calls = []
+
+    def task():
+        calls.append(1)
+        if len(calls) == 3:
+            queue._stopping.set()
+        return len(calls) < 3
+
+    queue.add_process_task(3600, task)
+    queue._app = app_context
+    queue._schedule()
+    assert len(calls) == 3
+
+
+def test_finished_jobs_are_pruned_after_their_ttl(queue):
+    now = datetime.utcnow()
+    old = now - timedelta(seconds=jobs.JOB_RESULT_TTL + 1)
+    for status, finished_at in [('done', old), ('failed', old), ('done', now), ('queued', None)]:
+        db.session.add(Job(kind='echo', payload='{}', priority=0, status=status,
+                           dedupe_key=dedupe_key('echo', {}), finished_at=finished_at))
+    db.session.commit()
+
+    queue._prune_finished()
+    assert sorted(job.status for job in Job.query.all()) == ['done', 'queued']
@@ -0,0 +1,70 @@
+import pytest
+
+from languages import (
+    AUTO, RECOGNITION, TRANSLATION, TTS, UnsupportedLanguage, capabilities, get_language,
+    recognition_locale, require, require_translation_pair
+)
+
+
+@pytest.mark.parametrize('spelling, code', [
+    ('en', 'en'),
+    (' FR ', 'fr'),
+    ('zh', 'zh-CN'),
+    ('zh-hans', 'zh-CN'),
+    ('ZH-CN', 'zh-CN'),
+    ('zh_tw', 'zh-TW'),
+    ('zh-HK', 'zh-TW'),
+    ('Chinese', 'zh-CN'),
+    ('German', 'de'),
+    ('es-ES', 'es'),
+])
+def test_aliases_resolve_to_the_canonical_code(spelling, code):
+    assert get_language(spelling).code == code
+
+
+@pytest.mark.parametrize('spelling, code', [('en-GB', 'en'), ('es_MX', 'es'), ('pt-PT', 'pt')])
+def test_region_variants_fall_back_to_their_base_language(spelling, code):
+    assert get_language(spelling).code == code
+
+
+@pytest.mark.parametrize('value', [None, '', 5, 1.5, ['en'], {'code': 'en'}, 'xx', 'klingon'])
+def test_unknown_or_non_string_codes_are_not_languages(value):
+    assert get_language(value) is None
+    with pytest.raises(UnsupportedLanguage):
+        require(value, TRANSLATION)
+
+
+@pytest.mark.parametrize('requested, locale', [
+    ('en', 'en-US'),
+    ('en-GB', 'en-GB'),
+    ('en_gb', 'en-GB'),
+    ('es-mx', 'es-MX'),
+    ('zh', 'zh-CN'),
+    ('zh-TW', 'zh-TW'),
+])
+def test_recognition_locale_keeps_an_explicit_region(requested, locale):
+    assert recognition_locale(requested) == locale
+
+
+def test_require_reports_code_and_operation():
+    with pytest.raises(UnsupportedLanguage) as error:
+        require('xx', TTS)
+    assert error.value.code == 'xx' and error.value.operation == TTS
+    assert isinstance(error.value, ValueError)
+
+
+@pytest.mark.parametrize('source', [None, '', 'auto', ' AUTO '])
+def test_translation_pair_accepts_auto_source(source):
+    assert require_translation_pair(source, 'zh') == (AUTO, get_language('zh-CN'))
+
+
+@pytest.mark.parametrize('source, target', [('en', 5), (5, 'en'), ('en', None), ('xx', 'fr'), ('en', 'xx')])
+def test_translation_pair_rejects_bad_codes(source, target):
+    with pytest.raises(UnsupportedLanguage):
+        require_translation_pair(source, target)
+
+
+def test_capabilities_list_every_operation_supported():
+    by_code = {entry['code']: entry for entry in capabilities()}
+    assert by_code['en']['operations'] == [RECOGNITION, TRANSLATION, TTS, 'chat']
+    assert by_code['zh-CN']['recognition_locale'] == 'zh-CN'
@@ -0,0 +1,102 @@
+import struct
+import threading
+import time
+
+import pytest
+
+import live_session
+from live_session import LiveSession, Outbox, SessionOverloaded, audio_format
+
+RATE = 16000
+
+
+def pcm(amplitude, seconds):
+    # 16-bit square wave; amplitude 0 is silence
+    samples = [amplitude if (i // 20) % 2 else -amplitude for i in range(int(RATE * seconds))]
+    return struct.pack(f'<{len(samples)}h', *samples)
+
+
+def utterances(count):
+    return [pcm(8000, 0.5) + pcm(0, 0.6) for _ in range(count)]
+
+
+def test_session_delivers_finals_in_order():
+    sent = []
+    outbox = Outbox()
+    sender = threading.Thread(target=outbox.drain, args=(sent.append,), daemon=True)
+    sender.start()
+    session = LiveSession(outbox, lambda *args: 'hello', lambda text: 'hola', partials=False)
+    session.start()
+    for chunk in utterances(3):
+        session.feed_audio(chunk)
+    session.finish()
+    sender.join(timeout=5)
+
+    assert [message['type'] for message in sent] == ['ready', 'final', 'final', 'final', 'closed']
+    assert [message['segment'] for message in sent if message['type'] == 'final'] == [0, 1, 2]
+
+
+@pytest.mark.parametrize('failure', ['send_fails', 'stops_reading'])
+def test_finish_never_hangs_after_client_disconnects(monkeypatch, failure):
+    monkeypatch.setattr(live_session, 'BACKPRESSURE_TIMEOUT', 0.2)
+    outbox = Outbox(max_size=2)
+    stalled = threading.Event()
+
+    def send(message):
+        if failure == 'send_fails':
+            raise ConnectionError('client went away')
+        stalled.wait()  # A client that never reads blocks the socket send
+
+    sender = threading.Thread(target=outbox.drain, args=(send,), daemon=True)
+    sender.start()
+    session = LiveSession(outbox, lambda *args: 'hello', lambda text: 'hola', partials=False)
+    session.start()
+    try:
+        for chunk in utterances(8):
+            session.feed_audio(chunk)
+    except SessionOverloaded:
+        pass  # The handler reports this and finishes the session
+
+    started = time.perf_counter()
+    session.finish()
+    assert time.perf_counter() - started < 5
+    session._worker.join(timeout=2)
+    assert not session._worker.is_alive()
+    assert outbox.closed
+    stalled.set()
+    sender.join(timeout=2)
+    assert not sender.is_alive()
+
+
+@pytest.mark.parametrize('rate, width', [
+    ('abc', 2), (16000, 'x'), (None, 2), (16000, 0), (16000, 3), (0, 2), (1000000, 2)
+])
+def test_audio_format_rejects_bad_values(rate, width):
+    with pytest.raises(ValueError):
+        audio_format(rate, width)
+
+
+def test_audio_format_accepts_strings():
+    assert audio_format('16000', '2') == (16000, 2)
+
+
+def test_partials_are_bounded_and_never_delay_a_final():
+    calls = []
+    outbox = Outbox()
+    session = LiveSession(outbox, lambda segment, *args: calls.append(len(segment)) or 'hel',
+                          lambda text: 'hola', partials=True)
+    assert LiveSession(outbox, None, None).partials is False
+
+    session.feed_audio(pcm(8000, 1.0))
+    session._segments.put((time.perf_counter(), b'closed utterance'))
+    session._send_partial()
+    assert calls == []  # The waiting final goes first
+
+    session._segments.get()
+    session._send_partial()
+    assert len(calls) == 1
+
+    session.feed_audio(pcm(8000, live_session.PARTIAL_MAX_MS / 1000))
+    session._last_partial_at = 0.0
+    session._send_partial()
+    assert len(calls) == 1  # Too long for another partial; only its final is sent
@@ -0,0 +1,52 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import retention
+from models import db, Translation
+from retention import compact_history, iter_archived
+
+
+@pytest.fixture
+def history(app_context, monkeypatch):
+    monkeypatch.setattr(retention, 'SEGMENT_MAX_ROWS', 7)
+    rng = random.Random(3)
+    start = datetime(2020, 1, 1)
+    # Live rows first, then an import of rows with older dates (and newer ids)
+    dates = [start + timedelta(days=i) for i in range(30)]
+    dates += [start + timedelta(days=rng.randint(0, 29), hours=rng.randint(0, 23)) for _ in range(20)]
+    dates += [start + timedelta(days=5)] * 4  # Same timestamp, told apart by id
+    for i, created_at in enumerate(dates):
+        db.session.add(Translation(
+            user_id=1, source_text=f's{i}', translated_text=f't{i}',
+            source_lang='en', target_lang='fr', created_at=created_at
+        ))
+    db.session.commit()
+    compact_history(older_than_days=1)
+    assert Translation.query.count() == 0
+    return sorted(((created_at, i + 1) for i, created_at in enumerate(dates)), reverse=True)
+
+
+def test_newest_first_is_by_date(history):
+    assert [(row.created_at, row.id) for row in iter_archived(1, newest_first=True)] == history
+
+
+def test_oldest_first_is_by_date(history):
+    assert [(row.created_at, row.id) for row in iter_archived(1)] == sorted(history)
+
+
+def test_paging_with_before_reaches_every_row(history):
+    seen = []
+    before = before_id = None
+    while True:
+        page = []
+        for row in iter_archived(1, newest_first=True, before=before, before_id=before_id):
+            page.append((row.created_at, row.id))
+            if len(page) == 5:
+                break
+        seen += page
+        if len(page) < 5:
+            break
+        before, before_id = page[-1]
+    assert seen == history
@@ -0,0 +1,64 @@
+import pytest
+
+from semantic_cache import SemanticCache, key_terms
+from shared_cache import SharedCache
+
+
+@pytest.mark.parametrize('cached, asked', [
+    ('How do I say my flight leaves at 5 pm tomorrow?', 'How do I say my flight leaves at 9 pm tomorrow?'),
+    ('How do I order a large coffee with milk?', 'How do I order a large tea with milk?'),
+    ('What does "bonjour" mean?', 'What does "bonsoir" mean?'),
+    ('How do I say my room number is 12?', 'How do I say my room number is 21?'),
+    ('How do I say hello in French?', 'How do I say hello in German?'),
+])
+def test_near_miss_questions_are_not_served(cached, asked):
+    cache = SemanticCache()
+    cache.set(cached, 'fr', 'answer')
+    assert cache.get(asked, 'fr') is None
+
+
+@pytest.mark.parametrize('cached, asked', [
+    ('How do I say thank you in Spanish?', 'how do you say thank you in spanish'),
+    ('How can I order a coffee?', 'How do I order a coffee, please?'),
+])
+def test_rephrased_questions_are_served(cached, asked):
+    cache = SemanticCache()
+    cache.set(cached, 'es', 'answer')
+    assert cache.get(asked, 'es')[0] == 'answer'
+
+
+def test_partitions_are_per_language():
+    cache = SemanticCache()
+    cache.set('How do I say good morning?', 'fr', 'Bonjour')
+    assert cache.get('How do I say good morning?', 'de') is None
+
+
+def test_expired_entries_are_not_served():
+    cache = SemanticCache(ttl=-1)
+    cache.set('How do I say good morning?', 'fr', 'Bonjour')
+    assert cache.get('How do I say good morning?', 'fr') is None
+
+
+def test_slot_reuse_forgets_the_old_question():
+    cache = SemanticCache(capacity=1)
+    cache.set('How do I say good morning?', 'fr', 'Bonjour')
+    cache.set('How do I say good night?', 'fr', 'Bonne nuit')
+    assert cache.get('How do I say good morning?', 'fr') is None
+    assert cache.get('How do I say good night?', 'fr')[0] == 'Bonne nuit'
+
+
+def test_key_terms_keep_numbers_and_quotes():
+    assert key_terms('Is it 5 pm?') != key_terms('Is it 9 pm?')
+    assert key_terms('What is "la gare"?') != key_terms('What is "gare la"?')
+
+
+def test_answers_are_shared_between_workers(tmp_path):
+    shared = SharedCache(path=str(tmp_path / 'cache.sqlite3'))
+    worker_a = SemanticCache(shared=shared)
+    worker_b = SemanticCache(shared=shared)
+    worker_a.set('How do I say thank you in Spanish?', 'es', 'Gracias')
+
+    assert worker_b.get('how do you say thank you in spanish', 'es')[0] == 'Gracias'
+    assert worker_b.get('How do I say thank you in Italian?', 'es') is None
+    # Promoted into worker B's own partition
+    assert worker_b.stats()['entries'] == {'es': 1}
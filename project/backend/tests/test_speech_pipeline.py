@@ -0,0 +1,75 @@
+import struct
+import time
+
+import pytest
+
+from speech_pipeline import MAX_SEGMENT_MS, SpeechSegmenter, run_pipeline
+
+RATE = 16000
+WIDTH = 2
+
+
+def pcm(amplitude, ms):
+    # 16-bit square wave; amplitude 0 is silence
+    samples = [amplitude if (i // 20) % 2 else -amplitude for i in range(RATE * ms // 1000)]
+    return struct.pack(f'<{len(samples)}h', *samples)
+
+
+def seconds(segment):
+    return len(segment) / (RATE * WIDTH)
+
+
+def test_pauses_split_speech_into_segments():
+    audio = (
+        pcm(0, 300)                       # Leading silence is skipped
+        + pcm(8000, 600) + pcm(0, 700)    # Pause long enough: closes segment 1
+        + pcm(8000, 400) + pcm(0, 200)    # Short pause: same segment
+        + pcm(8000, 400) + pcm(0, 700)
+        + pcm(8000, 60) + pcm(0, 700)     # Too little speech: noise
+        + pcm(8000, 300)                  # Still open at the end: flushed
+    )
+    segmenter = SpeechSegmenter(RATE, WIDTH)
+    # Arbitrary chunk sizes, not aligned to the analysis windows
+    segments = []
+    for offset in range(0, len(audio), 1234):
+        segments += segmenter.feed(audio[offset:offset + 1234])
+    segments += segmenter.flush()
+
+    # Speech plus the closing pause, to within the 30 ms analysis windows
+    assert [seconds(segment) for segment in segments] == pytest.approx([1.1, 1.5, 0.3], abs=0.06)
+
+
+def test_long_speech_is_cut_at_the_maximum_length():
+    segmenter = SpeechSegmenter(RATE, WIDTH)
+    segments = segmenter.feed(pcm(8000, MAX_SEGMENT_MS + 1000)) + segmenter.flush()
+    assert [round(seconds(segment), 2) for segment in segments] == [MAX_SEGMENT_MS / 1000, 1.0]
+
+
+def test_pipeline_returns_segments_in_audio_order_with_timings():
+    audio = b''.join(pcm(8000, 300 * (i + 1)) + pcm(0, 700) for i in range(4))
+    lengths = []
+
+    def recognize(segment):
+        # Earlier segments take longest, so they finish last
+        index = len(lengths)
+        lengths.append(seconds(segment))
+        time.sleep(0.05 * (4 - index))
+        return f'text {round(seconds(segment), 1)}'
+
+    segments, timings = run_pipeline(audio, RATE, WIDTH, recognize, str.upper, lambda text: text.encode())
+
+    assert [segment['index'] for segment in segments] == [0, 1, 2, 3]
+    assert [segment['translated_text'] for segment in segments] == [
+        f'TEXT {round(length, 1)}' for length in sorted(lengths)
+    ]
+    assert all(segment['audio'] == segment['translated_text'].encode() for segment in segments)
+    assert timings['segments'] == 4
+    assert timings['recognition_ms'] > 0 and timings['translation_ms'] >= 0 and timings['synthesis_ms'] >= 0
+    # Segments run concurrently: wall clock is less than the summed recognition time
+    assert timings['total_ms'] < timings['recognition_ms']
+
+
+def test_pipeline_skips_translation_of_silent_segments():
+    segments, timings = run_pipeline(pcm(8000, 500), RATE, WIDTH, lambda segment: None, str.upper)
+    assert segments == [{'index': 0, 'text': None, 'translated_text': None, 'audio': None}]
+    assert timings['translation_ms'] == 0.0 and timings['synthesis_ms'] == 0.0
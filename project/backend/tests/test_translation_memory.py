@@ -0,0 +1,194 @@
+import math
+import random
+import threading
+
+import pytest
+
+import translation_memory as tm
+from document_translation import SegmentCache
+from translation_memory import TranslationMemory, _PairIndex, _edit_distance, _max_distance, _ngrams
+
+WORDS = [
+    'the', 'train', 'leaves', 'at', 'noon', 'please', 'book', 'a', 'table', 'for', 'two',
+    'where', 'is', 'station', 'hotel', 'my', 'flight', 'monday', 'pm', 'tomorrow', 'coffee',
+    'with', 'milk', 'large', 'small', 'room', 'key', 'lost', 'help', 'ticket', '5', '6', '12'
+]
+
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def brute_force(sources, query, min_score, limit):
+    query_grams = _ngrams(query)
+    min_shared = math.ceil(len(query_grams) * tm.TM_MIN_SHARED_NGRAMS)
+    results = []
+    for entry_id, source in enumerate(sources):
+        if len(query_grams & _ngrams(source)) < min_shared:
+            continue
+        longest = max(len(source), len(query))
+        distance = levenshtein(query, source)
+        if distance <= _max_distance(longest, min_score):
+            results.append((1.0 - distance / longest, entry_id))
+    results.sort(reverse=True)
+    return results[:limit]
+
+
+def random_sentence(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 9)))
+
+
+def mutate(rng, text):
+    chars = list(text)
+    for _ in range(rng.randint(0, 4)):
+        position = rng.randrange(len(chars) + 1)
+        operation = rng.choice('isd')
+        if operation == 'i' or not chars:
+            chars.insert(position, rng.choice('abcdefgh 0123'))
+        elif position < len(chars):
+            if operation == 's':
+                chars[position] = rng.choice('abcdefgh 0123')
+            else:
+                del chars[position]
+    return ''.join(chars).strip() or 'x'
+
+
+@pytest.mark.parametrize('max_distance', range(6))
+def test_bounded_edit_distance(max_distance):
+    rng = random.Random(max_distance)
+    for _ in range(2000):
+        a = ''.join(rng.choice('ab c') for _ in range(rng.randint(0, 10)))
+        b = ''.join(rng.choice('ab c') for _ in range(rng.randint(0, 10)))
+        distance = levenshtein(a, b)
+        assert _edit_distance(a, b, max_distance) == min(distance, max_distance + 1)
+
+
+def build_index(rng, users=3, size=300):
+    index = _PairIndex()
+    for row_id in range(1, size + 1):
+        index.add(rng.randint(1, users), random_sentence(rng), row_id)
+    return index
+
+
+def own_sources(index, user_id):
+    # Entries of other users never match, whatever their text
+    return [source if owner == user_id else '\x00' for source, owner in zip(index.sources, index.user_ids.view())]
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('min_score', [0.5, 0.75, 0.9])
+def test_lookup_matches_brute_force(seed, min_score):
+    rng = random.Random(seed)
+    index = build_index(rng)
+    lock = threading.Lock()
+
+    for _ in range(60):
+        user_id = rng.randint(1, 3)
+        query = mutate(rng, rng.choice(index.sources)) if rng.random() < 0.7 else random_sentence(rng)
+        for limit in (1, 3, 10):
+            expected = brute_force(own_sources(index, user_id), query, min_score, limit)
+            assert index.lookup(query, user_id, min_score, limit, lock) == expected, query
+
+
+def test_candidate_cap_keeps_scores_exact(monkeypatch):
+    monkeypatch.setattr(tm, 'TM_MAX_CANDIDATES', 20)
+    rng = random.Random(7)
+    index = build_index(rng, users=1)
+    lock = threading.Lock()
+
+    for _ in range(60):
+        source = rng.choice(index.sources)
+        results = index.lookup(source, 1, 0.75, 3, lock)
+        # The source itself shares every rare n-gram, so the cap never drops it
+        assert results[0][0] == 1.0
+        query = mutate(rng, source)
+        for score, entry_id in index.lookup(query, 1, 0.75, 3, lock):
+            candidate = index.sources[entry_id]
+            longest = max(len(candidate), len(query))
+            assert score == 1.0 - levenshtein(query, candidate) / longest >= 0.75
+
+
+def save(user_id, source_text, translated_text):
+    from models import db, Translation
+
+    row = Translation(user_id=user_id, source_text=source_text, translated_text=translated_text,
+                      source_lang='en', target_lang='fr')
+    db.session.add(row)
+    db.session.commit()
+    return row
+
+
+def test_suggestions_are_per_user(app_context):
+    memory = TranslationMemory(served=SegmentCache())
+    save(1, 'Meet me at the hotel at 5pm', 'Rendez-vous à 17h')
+    memory.sync()
+
+    assert memory.lookup(1, 'meet me at the hotel at 6pm', 'en', 'fr')[0]['translated_text'] == 'Rendez-vous à 17h'
+    assert memory.lookup(2, 'meet me at the hotel at 6pm', 'en', 'fr') == []
+
+
+def test_only_identical_upstream_sources_are_served(app_context):
+    memory = TranslationMemory(served=SegmentCache())
+    memory.remember('The train leaves on Monday at 5pm', 'Le train part lundi à 17h', 'en', 'fr')
+
+    assert memory.best_match('The train leaves on Monday at 5pm', 'en', 'fr') == 'Le train part lundi à 17h'
+    assert memory.best_match('The train leaves on Monday at 6pm', 'en', 'fr') is None
+    assert memory.best_match('The train leaves on Monday at 5pm', 'en', 'de') is None
+    # Rows indexed for suggestions are never served
+    save(1, 'See you soon', 'À bientôt')
+    memory.sync()
+    assert memory.best_match('See you soon', 'en', 'fr') is None
+
+
+def test_sync_indexes_rows_saved_by_any_worker_in_batches(app_context):
+    memory = TranslationMemory(served=SegmentCache())
+    save(1, 'Where is the station', 'Où est la gare')
+    assert memory.sync() is False
+    assert memory.lookup(1, 'where is the station?', 'en', 'fr')
+
+    # Rows committed elsewhere show up on later syncs, a batch at a time
+    save(1, 'Where is the hotel', "Où est l'hôtel")
+    save(1, 'Where is the museum', 'Où est le musée')
+    assert memory.lookup(1, 'where is the hotel?', 'en', 'fr') == []
+    assert memory.sync(max_rows=1) is True
+    assert memory.lookup(1, 'where is the hotel?', 'en', 'fr')[0]['translated_text'] == "Où est l'hôtel"
+    assert memory.lookup(1, 'where is the museum?', 'en', 'fr') == []
+    assert memory.sync(max_rows=1) is True
+    assert memory.sync(max_rows=1) is False
+    assert memory.lookup(1, 'where is the museum?', 'en', 'fr')
+
+
+def test_newest_translation_of_a_source_is_suggested(app_context):
+    memory = TranslationMemory(served=SegmentCache())
+    save(1, 'Good morning', 'Bonjour')
+    save(1, 'good  morning', 'Bon matin')
+    memory.sync()
+
+    assert memory.lookup(1, 'Good morning!', 'en', 'fr') == [
+        {'source_text': 'good morning', 'translated_text': 'Bon matin', 'score': 0.9231}
+    ]
+
+
+def test_archived_rows_are_not_suggested_by_any_worker(app_context):
+    from datetime import datetime, timedelta
+    from models import db
+    from retention import compact_history
+
+    row = save(1, 'Where is the station', 'Où est la gare')
+    row.created_at = datetime.utcnow() - timedelta(days=100)
+    db.session.commit()
+    indexed_before = TranslationMemory(served=SegmentCache())
+    indexed_before.sync()
+    assert indexed_before.lookup(1, 'where is the station?', 'en', 'fr')
+
+    compact_history(older_than_days=30)
+    indexed_after = TranslationMemory(served=SegmentCache())
+    indexed_after.sync()
+    assert indexed_before.lookup(1, 'where is the station?', 'en', 'fr') == []
+    assert indexed_after.lookup(1, 'where is the station?', 'en', 'fr') == []
@@ -0,0 +1,439 @@
+import math
+import os
+import re
+import threading
+
+import numpy as np
+
+from document_translation import segment_cache, segment_key
+
+# Translation memory: reuses past source/target pairs from the Translation table.
+#
+# Serving: /api/translate only reuses a translation whose source is the very
+# same text, and only one the upstream translator produced; those live in the
+# segment cache, shared with document translation and across workers. A
+# fuzzy match is never served, since "at 5pm" and "at 6pm" score high but
+# translate differently.
+#
+# Suggestions: one character n-gram inverted index per language pair,
+# holding every user's sources with their owner; a lookup only counts the
+# asking user's entries, so suggestions never echo another user's text. Each
+# worker process catches up on new Translation rows in the background
+# (sync(), a bounded batch at a time), and translations are read from the
+# table when suggested. A lookup only reads the length buckets that can
+# reach the threshold, generates candidates from the rarest n-grams there,
+# counts the overlap with the rest, drops candidates whose n-gram or
+# character counts already bound the edit distance too high, and reranks the
+# rest by bounded edit distance, best upper bound first, stopping once no
+# remaining one can make the top `limit`. Scoring runs on snapshots outside
+# the lock.
+
+NGRAM_SIZE = 3
+# Scores are 1 - edit_distance / max_len, computed on normalized text
+TM_SUGGEST_THRESHOLD = float(os.getenv('TM_SUGGEST_THRESHOLD', '0.75'))
+# A suggestion must also share this fraction of the query's n-grams
+TM_MIN_SHARED_NGRAMS = float(os.getenv('TM_MIN_SHARED_NGRAMS', '0.5'))
+# Candidates probed per length bucket; past this only the ones sharing the
+# most rare n-grams are kept, so very large histories stay fast
+TM_MAX_CANDIDATES = int(os.getenv('TM_MAX_CANDIDATES', '5000'))
+# Length buckets: sources within a factor of this of each other share one
+LENGTH_BUCKET_RATIO = 1.25
+# Character histogram bins per entry, for the bag-distance bound
+HISTOGRAM_BINS = 16
+# user_ids value of an entry whose Translation rows are gone
+REMOVED = -1
+# Rows one sync() call indexes at most, so a catch-up never runs for long
+TM_SYNC_BATCH = int(os.getenv('TM_SYNC_BATCH', '5000'))
+# Seconds between catch-ups with the Translation table
+TM_SYNC_INTERVAL = float(os.getenv('TM_SYNC_INTERVAL', '2'))
+# Texts longer than this are documents, not phrases; they are not indexed
+MAX_SOURCE_CHARS = 1000
+
+_whitespace_re = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    return _whitespace_re.sub(' ', text).strip().lower()
+
+
+def _ngrams(text):
+    padded = f' {text} '
+    if len(padded) <= NGRAM_SIZE:
+        return {padded}
+    return {padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+
+def _max_distance(longest, min_score):
+    # Largest edit distance that still scores >= min_score (float-safe)
+    return math.floor(longest * (1.0 - min_score) + 1e-9)
+
+
+def _edit_distance(a, b, max_distance):
+    """Levenshtein distance, or max_distance + 1 once it is known to be larger.
+
+    Bit-parallel (Myers/Hyyrö): one column of the DP matrix is a pair of
+    integers used as bit vectors over b, so each character of a costs a
+    handful of integer operations instead of len(b) cell updates.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if not a or not b:
+        return len(a) or len(b)
+    match_masks = {}
+    for i, char in enumerate(b):
+        match_masks[char] = match_masks.get(char, 0) | (1 << i)
+    mask = (1 << len(b)) - 1
+    last_row = 1 << (len(b) - 1)
+    positive, negative = mask, 0  # Vertical deltas of +1 / -1
+    distance = len(b)
+    remaining = len(a)
+    for char in a:
+        matches = match_masks.get(char, 0)
+        vertical = matches | negative
+        horizontal = (((matches & positive) + positive) ^ positive) | matches
+        horizontal_positive = negative | ~(horizontal | positive)
+        horizontal_negative = positive & horizontal
+        if horizontal_positive & last_row:
+            distance += 1
+        elif horizontal_negative & last_row:
+            distance -= 1
+        remaining -= 1
+        # Each remaining column lowers the distance by at most one
+        if distance - remaining > max_distance:
+            return max_distance + 1
+        horizontal_positive = (horizontal_positive << 1) | 1
+        horizontal_negative <<= 1
+        positive = (horizontal_negative | ~(vertical | horizontal_positive)) & mask
+        negative = horizontal_positive & vertical & mask
+    return distance
+
+
+class _IntArray:
+    """Append-only int32 array (or uint8 rows) with amortized O(1) appends and zero-copy views."""
+
+    __slots__ = ('_data', '_size')
+
+    def __init__(self, columns=None):
+        self._data = np.empty(4, dtype=np.int32) if columns is None else np.empty((4, columns), dtype=np.uint8)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, value):
+        if self._size == len(self._data):
+            grown = np.empty((len(self._data) * 2,) + self._data.shape[1:], dtype=self._data.dtype)
+            grown[:self._size] = self._data
+            self._data = grown
+        self._data[self._size] = value
+        self._size += 1
+
+    def view(self):
+        return self._data[:self._size]
+
+
+def _histogram(text):
+    """Character counts folded into HISTOGRAM_BINS bins, saturating at 255."""
+    counts = np.bincount(np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32) % HISTOGRAM_BINS,
+                         minlength=HISTOGRAM_BINS)
+    return np.minimum(counts, 255).astype(np.uint8)
+
+
+def _length_bucket(length):
+    return int(math.log(max(length, 1)) / math.log(LENGTH_BUCKET_RATIO))
+
+
+class _LengthBucket:
+    """The entries of one length bucket, with bucket-local posting lists."""
+
+    __slots__ = ('entry_ids', 'postings')
+
+    def __init__(self):
+        self.entry_ids = _IntArray()  # local id -> entry id
+        self.postings = {}            # n-gram -> _IntArray of local ids, ascending
+
+    def add(self, entry_id, grams):
+        local_id = len(self.entry_ids)
+        self.entry_ids.append(entry_id)
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = _IntArray()
+            posting.append(local_id)
+
+
+def _count_overlap(postings, min_overlap, size, keep):
+    """Local ids sharing at least min_overlap n-grams with the query, and their counts.
+
+    `postings` are the query's posting lists in one bucket, rarest first. An
+    id with min_overlap shared n-grams appears in one of the
+    (len(postings) - min_overlap + 1) rarest lists, so only those generate
+    candidates, and only the ones `keep(local_ids)` accepts are counted; the
+    common lists are probed for the survivors with a binary search, dropping
+    every candidate that can no longer reach min_overlap.
+    """
+    prefix = len(postings) - min_overlap + 1
+    generating, probing = postings[:prefix], postings[prefix:]
+    generated = np.concatenate(generating)
+    generated = generated[keep(generated)]
+    if len(generated) > size // 8:
+        # Dense case: a counting pass beats sorting
+        counts = np.bincount(generated, minlength=size)
+        candidates = np.flatnonzero(counts).astype(np.int32)
+        overlap = counts[candidates]
+    else:
+        candidates, overlap = np.unique(generated, return_counts=True)
+    if len(candidates) > TM_MAX_CANDIDATES:
+        kept = np.argpartition(-overlap, TM_MAX_CANDIDATES)[:TM_MAX_CANDIDATES]
+        kept.sort()
+        candidates, overlap = candidates[kept], overlap[kept]
+
+    for probed, posting in enumerate(probing):
+        reachable = overlap + (len(probing) - probed) >= min_overlap
+        candidates, overlap = candidates[reachable], overlap[reachable]
+        if not len(candidates):
+            break
+        positions = np.searchsorted(posting, candidates)
+        positions[positions == len(posting)] = 0
+        overlap += posting[positions] == candidates
+
+    enough = overlap >= min_overlap
+    return candidates[enough], overlap[enough]
+
+
+class _PairIndex:
+    """Inverted n-gram index over the unique sources of one language pair.
+
+    An entry is one source in one user's history; lookups only count the
+    candidates of the asking user. Entries are partitioned by source length
+    into buckets growing by LENGTH_BUCKET_RATIO, so a lookup only reads the
+    posting lists of sources whose length alone does not already rule out
+    min_score. Translations are not kept in memory, only the id of the
+    newest Translation row with that source.
+    """
+
+    def __init__(self):
+        self.sources = []       # entry id -> normalized source text
+        self.user_ids = _IntArray()     # entry id -> owner, REMOVED once its rows are gone
+        self.row_ids = _IntArray()      # entry id -> newest Translation.id with this source
+        self.lengths = _IntArray()      # entry id -> len(source)
+        self.gram_counts = _IntArray()  # entry id -> number of distinct n-grams
+        self.histograms = _IntArray(HISTOGRAM_BINS)  # entry id -> _histogram(source)
+        self.by_source = {}     # (user id, normalized source) -> entry id
+        self.buckets = {}       # length bucket -> _LengthBucket
+
+    def add(self, user_id, normalized, row_id):
+        entry_id = self.by_source.get((user_id, normalized))
+        if entry_id is not None:
+            # Same source seen again: newest row wins, index unchanged
+            self.user_ids.view()[entry_id] = user_id
+            self.row_ids.view()[entry_id] = row_id
+            return
+        entry_id = len(self.sources)
+        grams = _ngrams(normalized)
+        self.sources.append(normalized)
+        self.user_ids.append(user_id)
+        self.row_ids.append(row_id)
+        self.lengths.append(len(normalized))
+        self.gram_counts.append(len(grams))
+        self.histograms.append(_histogram(normalized))
+        self.by_source[(user_id, normalized)] = entry_id
+        bucket = self.buckets.get(_length_bucket(len(normalized)))
+        if bucket is None:
+            bucket = self.buckets[_length_bucket(len(normalized))] = _LengthBucket()
+        bucket.add(entry_id, grams)
+
+    def remove(self, entry_id):
+        """Stop suggesting an entry; adding its source again brings it back."""
+        self.user_ids.view()[entry_id] = REMOVED
+
+    def lookup(self, normalized, user_id, min_score, limit, lock):
+        grams = _ngrams(normalized)
+        query_count = len(grams)
+        query_length = len(normalized)
+        # Lengths outside [shortest, longest] score below min_score (with
+        # one character of slack; the exact check comes later)
+        shortest = max(1, int(query_length * min_score))
+        longest_allowed = int(query_length / max(min_score, 0.01)) + 1
+        # One edit destroys at most NGRAM_SIZE of the query's n-grams
+        min_overlap = max(
+            1,
+            query_count - NGRAM_SIZE * _max_distance(longest_allowed, min_score),
+            math.ceil(query_count * TM_MIN_SHARED_NGRAMS)
+        )
+
+        with lock:
+            # The arrays are append-only, so these views stay consistent after
+            # the lock is released; scoring runs without holding it
+            snapshots = []
+            for bucket_id in range(_length_bucket(shortest), _length_bucket(longest_allowed) + 1):
+                bucket = self.buckets.get(bucket_id)
+                if bucket is not None:
+                    snapshots.append((
+                        bucket.entry_ids.view(),
+                        [bucket.postings[g].view() for g in grams if g in bucket.postings]
+                    ))
+            user_ids = self.user_ids.view()
+            lengths = self.lengths.view()
+            gram_counts = self.gram_counts.view()
+            histograms = self.histograms.view()
+
+        found = []
+        for entry_ids, postings in snapshots:
+            if len(postings) < min_overlap:
+                continue
+            # Rarest n-grams first: they generate the fewest candidates
+            postings.sort(key=len)
+            local_ids, overlap = _count_overlap(
+                postings, min_overlap, len(entry_ids), lambda local_ids: user_ids[entry_ids[local_ids]] == user_id
+            )
+            if len(local_ids):
+                found.append((entry_ids[local_ids], overlap))
+        if not found:
+            return []
+        candidates = np.concatenate([ids for ids, _ in found])
+        overlap = np.concatenate([counts for _, counts in found])
+
+        # Every n-gram one side has and the other lacks was destroyed by an
+        # edit, and one edit destroys at most NGRAM_SIZE, which together with
+        # the length difference bounds the distance from below
+        candidate_lengths = lengths[candidates]
+        longest = np.maximum(candidate_lengths, query_length)
+        unshared = np.maximum(query_count, gram_counts[candidates]) - overlap
+        lower_bound = np.maximum(
+            np.abs(candidate_lengths - query_length), -(-unshared // NGRAM_SIZE)
+        )
+        allowed = np.floor(longest * (1.0 - min_score) + 1e-9)
+        possible = lower_bound <= allowed
+        candidates, longest = candidates[possible], longest[possible]
+        lower_bound, allowed = lower_bound[possible], allowed[possible]
+        # One edit changes at most one character count on either side (bag distance)
+        difference = histograms[candidates].astype(np.int16) - _histogram(normalized)
+        lower_bound = np.maximum.reduce([
+            lower_bound,
+            np.maximum(difference, 0).sum(axis=1),
+            np.maximum(-difference, 0).sum(axis=1)
+        ])
+        possible = lower_bound <= allowed
+        candidates, longest = candidates[possible], longest[possible]
+        best_possible = 1.0 - lower_bound[possible] / longest
+        # Best bound first, newest entry first among equal bounds
+        order = np.lexsort((-candidates, -best_possible))
+
+        results = []
+        for i in order.tolist():
+            if len(results) >= limit and best_possible[i] < results[-1][0]:
+                break  # Nothing left can make the top `limit`
+            candidate = int(candidates[i])
+            entry_longest = int(longest[i])
+            max_distance = _max_distance(entry_longest, min_score)
+            distance = _edit_distance(normalized, self.sources[candidate], max_distance)
+            if distance > max_distance:
+                continue
+            results.append((1.0 - distance / entry_longest, candidate))
+            results.sort(reverse=True)
+            del results[limit:]
+        return results
+
+
+class TranslationMemory:
+    def __init__(self, served=segment_cache):
+        self._pairs = {}
+        self._served = served
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._synced_id = 0  # Highest Translation.id indexed
+
+    def add(self, user_id, source_text, source_lang, target_lang, row_id):
+        """Index Translation row `row_id` of `user_id`'s history for their suggestions."""
+        normalized = normalize_text(source_text)
+        if not normalized or len(normalized) > MAX_SOURCE_CHARS:
+            return
+        with self._lock:
+            index = self._pairs.get((source_lang, target_lang))
+            if index is None:
+                index = self._pairs[(source_lang, target_lang)] = _PairIndex()
+            index.add(user_id, normalized, row_id)
+
+    def lookup(self, user_id, text, source_lang, target_lang, min_score=None, limit=3):
+        """Return up to `limit` of the user's own past translations as dicts, best first.
+
+        Translations are read from the Translation table, so rows archived
+        or deleted since they were indexed are never suggested, whichever
+        worker answers.
+        """
+        from models import db, Translation
+
+        if min_score is None:
+            min_score = TM_SUGGEST_THRESHOLD
+        normalized = normalize_text(text)
+        if not normalized or len(normalized) > MAX_SOURCE_CHARS or limit < 1:
+            return []
+        with self._lock:
+            index = self._pairs.get((source_lang, target_lang))
+        if index is None:
+            return []
+        while True:
+            matches = index.lookup(normalized, user_id, min_score, limit, self._lock)
+            row_ids = {entry_id: int(index.row_ids.view()[entry_id]) for _, entry_id in matches}
+            translations = dict(db.session.query(Translation.id, Translation.translated_text).filter(
+                Translation.id.in_(list(row_ids.values()))
+            ).all()) if matches else {}
+            gone = [entry_id for entry_id, row_id in row_ids.items() if row_id not in translations]
+            if not gone:
+                break
+            with self._lock:
+                for entry_id in gone:
+                    index.remove(entry_id)
+        return [{
+            'source_text': index.sources[entry_id],
+            'translated_text': translations[row_ids[entry_id]],
+            'score': round(score, 4)
+        } for score, entry_id in matches]
+
+    def remember(self, source_text, translated_text, source_lang, target_lang):
+        """Record an upstream translation so the same source can be served again.
+
+        Only for results that came from the translator, never from memory.
+        """
+        self._served.set(segment_key(source_text.strip(), source_lang, target_lang), translated_text)
+
+    def best_match(self, text, source_lang, target_lang):
+        """Translation of exactly this source, good to serve without an upstream call, or None."""
+        return self._served.get(segment_key(text.strip(), source_lang, target_lang))
+
+    def sync(self, max_rows=TM_SYNC_BATCH):
+        """Index up to `max_rows` Translation rows written since the last sync, by any worker.
+
+        Every process keeps its own index and the job scheduler calls this
+        in the background (see JobQueue.add_process_task), so rows another
+        worker saved or imported are suggested too. Returns True while rows
+        are left to index.
+        """
+        from models import db, Translation
+
+        with self._sync_lock:
+            rows = db.session.query(
+                Translation.id,
+                Translation.user_id,
+                Translation.source_text,
+                Translation.source_lang,
+                Translation.target_lang
+            ).filter(Translation.id > self._synced_id).order_by(Translation.id).limit(max_rows).all()
+            for row in rows:
+                self.add(row.user_id, row.source_text, row.source_lang, row.target_lang, row.id)
+            if rows:
+                self._synced_id = rows[-1].id
+        if rows:
+            print(f"Translation memory indexed {len(rows)} rows")  # Debug log
+        return len(rows) == max_rows
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pairs': len(self._pairs),
+                'entries': sum(len(index.sources) for index in self._pairs.values())
+            }
+
+
+translation_memory = TranslationMemory()
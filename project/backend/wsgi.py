@@ -0,0 +1,7 @@
+"""Production entry point: `gunicorn -c gunicorn.conf.py wsgi:app`.
+
+gunicorn.conf.py preloads this module in the master, so the app module is
+imported once and the workers share its pages after fork. Importing it does
+not touch the database schema; apply the migrations first.
+"""
+from app import app
@@ -84,6 +84,7 @@ const ChatbotPage: React.FC = () => {
         body: JSON.stringify({
           message: inputMessage,
           language: currentLanguage,
+          first_turn: !messages.some((message) => message.role === 'user'),
         }),
       });
 